@@ -0,0 +1,100 @@
+import bisect
+from collections import OrderedDict
+
+MAX_USERS = 10_000
+
+
+# ---------------- PER-USER ALIAS INDEX ----------------
+# Aliases and titles of each user's tracked anime, loaded lazily from the
+# database on first use and kept current by database.py's write paths, so
+# autocomplete keystrokes never need a query.
+class _UserEntries:
+    def __init__(self, rows):
+        self.by_id = {anime_id: (alias, title) for anime_id, alias, title in rows}
+        self._keys = None
+
+    # Sorted (lowercased key, alias, title) for both aliases and titles; rebuilt after writes
+    def keys(self):
+        if self._keys is None:
+            keys = []
+            for alias, title in self.by_id.values():
+                keys.append(((alias or "").lower(), alias, title))
+                keys.append(((title or "").lower(), alias, title))
+            self._keys = sorted(keys)
+        return self._keys
+
+
+class AliasIndex:
+    def __init__(self, max_users=MAX_USERS):
+        self.max_users = max_users
+        self._users = OrderedDict()  # user_id -> _UserEntries, least recently used first
+        self._generation = {}        # user_id -> write counter, guards loads racing writes
+
+    def loaded(self, user_id):
+        return user_id in self._users
+
+    def begin_load(self, user_id):
+        return self._generation.setdefault(user_id, 0)
+
+    # rows: (anime_id, alias, title); dropped if a write landed while they were read
+    def finish_load(self, user_id, rows, token):
+        if self._generation.get(user_id, 0) != token:
+            return False
+        self._users[user_id] = _UserEntries(rows)
+        while len(self._users) > self.max_users:
+            evicted, _ = self._users.popitem(last=False)
+            self._generation.pop(evicted, None)
+        return True
+
+    def _write(self, user_id):
+        if user_id in self._generation:
+            self._generation[user_id] += 1
+        if entries := self._users.get(user_id):
+            entries._keys = None
+        return entries
+
+    def put(self, user_id, anime_id, alias, title):
+        if entries := self._write(user_id):
+            entries.by_id[anime_id] = (alias, title)
+
+    def set_alias(self, user_id, anime_id, alias):
+        if (entries := self._write(user_id)) and anime_id in entries.by_id:
+            entries.by_id[anime_id] = (alias, entries.by_id[anime_id][1])
+
+    def remove(self, user_id, anime_id):
+        if entries := self._write(user_id):
+            entries.by_id.pop(anime_id, None)
+
+    def aliases(self, user_id):
+        self._users.move_to_end(user_id)
+        return [alias for alias, _ in self._users[user_id].by_id.values()]
+
+    def anime_ids(self, user_id):
+        self._users.move_to_end(user_id)
+        return set(self._users[user_id].by_id)
+
+    # Prefix matches (alias or title) first, then substring matches; returns (alias, title)
+    def search(self, user_id, current, limit=25):
+        self._users.move_to_end(user_id)
+        keys = self._users[user_id].keys()
+        current = current.lower()
+        seen, results = set(), []
+
+        def add(alias, title):
+            if alias not in seen:
+                seen.add(alias)
+                results.append((alias, title))
+
+        i = bisect.bisect_left(keys, (current,))
+        while i < len(keys) and keys[i][0].startswith(current) and len(results) < limit:
+            add(keys[i][1], keys[i][2])
+            i += 1
+        for key, alias, title in keys:
+            if len(results) >= limit:
+                break
+            if current in key:
+                add(alias, title)
+        return results
+
+
+alias_index = AliasIndex()
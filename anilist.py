@@ -1,8 +1,20 @@
 import aiohttp
 import asyncio
+import orjson
+import os
+import random
 import re
+import time
+from metrics import ANILIST_SECONDS, ANILIST_THROTTLED, ANILIST_ERRORS
 
-API_URL = "https://graphql.anilist.co"
+API_URL = os.getenv("ANILIST_API_URL") or "https://graphql.anilist.co"
+ID_PAGE_SIZE = 50  # AniList caps perPage at 50
+LIST_CHUNK_SIZE = 500  # ... and perChunk at 500
+MAX_SEASON_PAGES = 10
+
+INTERACTIVE, BACKGROUND = 0, 1  # request priorities: slash commands vs. sweeps
+MAX_RETRIES = 3
+BACKOFF_BASE, BACKOFF_MAX = 0.5, 8.0
 
 # Reuse session to prevent connection overhead
 _session = None
@@ -16,99 +28,248 @@ async def get_session():
     return _session
 
 
+_TAGS = re.compile(r"<[^>]*>")
+
+
+# Descriptions are kept as AniList sends them and cleaned only when displayed
 def clean_description(text: str, max_len: int = 300):
     if not text:
         return None
-    text = re.sub(r"<.*?>", "", text)
+    text = _TAGS.sub("", text)
     return text[:max_len] + ("..." if len(text) > max_len else "")
 
 
-async def anilist_request(query, variables=None):
-    try:
-        session = await get_session()
-        async with session.post(
-            API_URL,
-            json={"query": query, "variables": variables or {}},
-        ) as response:
+# ---------------- PROJECTIONS ----------------
+# The media fields each consumer needs, so sweeps don't download descriptions
+# and covers (the seasonal list has its own query in _seasonal_page). A record
+# fetched with a wider projection satisfies a narrower one (see covers()),
+# which lets the cache serve a preview from a full card.
+FIELDS = {
+    "title": "title { romaji english }",
+    "synonyms": "synonyms",
+    "description": "description(asHtml: false)",
+    "coverImage": "coverImage { large medium color }",
+    "genres": "genres",
+    "episodes": "episodes",
+    "nextAiringEpisode": "nextAiringEpisode { episode airingAt }",
+}
+PROJECTIONS = {
+    "airing": ("title", "synonyms", "nextAiringEpisode"),              # notifier
+    "cover": ("title", "synonyms", "coverImage"),                      # /list preview
+    "card": tuple(FIELDS),                                             # /progress, /track, stored rows
+    "titles": ("title", "synonyms"),                                   # /import
+}
 
-            if response.status != 200:
-                print("AniList HTTP error:", response.status)
-                return None
 
-            data = await response.json()
+def selection(projection):
+    return " ".join(["id", *(FIELDS[f] for f in PROJECTIONS[projection])])
 
-            if "errors" in data:
-                print("AniList API error:", data["errors"])
-                return None
 
-            return data.get("data")
+def covers(media, projection):
+    return bool(media) and all(f in media for f in PROJECTIONS[projection])
 
-    except asyncio.TimeoutError:
-        print("AniList request timed out.")
-        return None
-    except Exception as e:
-        print("AniList exception:", e)
-        return None
+
+# ---------------- RATE LIMITING ----------------
+# Token bucket refilled at limit/period and resynced from AniList's
+# X-RateLimit-* headers. Background traffic leaves a reserve of tokens for
+# interactive requests and yields whenever one of them is waiting.
+class RateLimiter:
+    def __init__(self, limit=90, period=60.0, reserve=0.2):
+        self.limit = limit
+        self.period = period
+        self.reserve = reserve
+        self.tokens = float(limit)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._interactive_waiting = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.limit, self.tokens + (now - self._updated) * self.limit / self.period)
+        self._updated = now
+
+    async def acquire(self, priority=INTERACTIVE):
+        interactive = priority == INTERACTIVE
+        floor = 1 if interactive else 1 + self.limit * self.reserve
+        if interactive:
+            self._interactive_waiting += 1
+        try:
+            while True:
+                self._refill()
+                if (blocked := self._blocked_until - time.monotonic()) > 0:
+                    await asyncio.sleep(blocked)
+                    continue
+                if self.tokens >= floor and (interactive or not self._interactive_waiting):
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep(max(floor - self.tokens, 0.1) * self.period / self.limit)
+        finally:
+            if interactive:
+                self._interactive_waiting -= 1
+
+    def update(self, headers):
+        if limit := headers.get("X-RateLimit-Limit"):
+            self.limit = int(limit)
+        if (remaining := headers.get("X-RateLimit-Remaining")) is not None:
+            self._refill()
+            self.tokens = min(self.tokens, float(remaining))
+
+    def block(self, seconds):
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+
+limiter = RateLimiter()
+
+
+async def _backoff(attempt):
+    # Full jitter so retries from concurrent sweeps don't land together
+    if attempt < MAX_RETRIES:
+        await asyncio.sleep(random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)))
+
+
+# kind labels the query type in metrics (search, by_id, id_in, seasonal)
+async def anilist_request(query, variables=None, priority=INTERACTIVE, kind="other"):
+    for attempt in range(MAX_RETRIES + 1):
+        await limiter.acquire(priority)
+        start = time.perf_counter()
+        try:
+            session = await get_session()
+            async with session.post(
+                API_URL,
+                data=orjson.dumps({"query": query, "variables": variables or {}}),
+                headers={"Content-Type": "application/json"},
+            ) as response:
+                limiter.update(response.headers)
+
+                if response.status == 429:
+                    retry_after = float(response.headers.get("Retry-After") or 60)
+                    print(f"AniList rate limited, retrying in {retry_after}s.")
+                    ANILIST_THROTTLED.labels(kind).inc()
+                    limiter.block(retry_after)
+                    continue
+
+                if response.status >= 500:
+                    print("AniList HTTP error:", response.status)
+                    ANILIST_ERRORS.labels(kind, "5xx").inc()
+                    await _backoff(attempt)
+                    continue
+
+                if response.status != 200:
+                    print("AniList HTTP error:", response.status)
+                    ANILIST_ERRORS.labels(kind, str(response.status)).inc()
+                    return None
+
+                data = orjson.loads(await response.read())
+
+                if "errors" in data:
+                    print("AniList API error:", data["errors"])
+                    ANILIST_ERRORS.labels(kind, "graphql").inc()
+                    return None
+
+                return data.get("data")
+
+        except asyncio.TimeoutError:
+            print("AniList request timed out.")
+            ANILIST_ERRORS.labels(kind, "timeout").inc()
+            await _backoff(attempt)
+        except aiohttp.ClientError as e:
+            print("AniList connection error:", e)
+            ANILIST_ERRORS.labels(kind, "connection").inc()
+            await _backoff(attempt)
+        except Exception as e:
+            print("AniList exception:", e)
+            ANILIST_ERRORS.labels(kind, "exception").inc()
+            return None
+        finally:
+            ANILIST_SECONDS.labels(kind).observe(time.perf_counter() - start)
+
+    print(f"AniList request failed after {MAX_RETRIES + 1} attempts.")
+    ANILIST_ERRORS.labels(kind, "exhausted").inc()
+    return None
 
 
 # ---------------- SEARCH FUNCTIONS ----------------
 
-async def search_anime(search):
-    query = """
-    query ($search: String) {
-      Media(search: $search, type: ANIME) {
-        id
-        title { romaji }
-        description(asHtml: false)
-        coverImage { large medium color }
-        genres
-        episodes
-        nextAiringEpisode {
-          episode
-          airingAt
-        }
-      }
-    }
+async def search_anime(search, projection="card"):
+    query = f"""
+    query ($search: String) {{
+      Media(search: $search, type: ANIME) {{ {selection(projection)} }}
+    }}
     """
-    data = await anilist_request(query, {"search": search})
-    if not data:
-        return None
+    data = await anilist_request(query, {"search": search}, kind="search")
+    return data["Media"] if data else None
 
-    media = data["Media"]
-    media["description"] = clean_description(media.get("description"))
-    return media
 
+async def search_anime_by_id(anime_id, projection="card"):
+    query = f"""
+    query ($id: Int) {{
+      Media(id: $id, type: ANIME) {{ {selection(projection)} }}
+    }}
+    """
+    data = await anilist_request(query, {"id": anime_id}, kind="by_id")
+    return data["Media"] if data else None
 
-async def search_anime_by_id(anime_id):
-    query = """
-    query ($id: Int) {
-      Media(id: $id, type: ANIME) {
-        id
-        title { romaji }
-        description(asHtml: false)
-        coverImage { large medium color }
-        genres
-        episodes
-        nextAiringEpisode {
-          episode
-          airingAt
-        }
-      }
-    }
+
+async def _search_page_by_ids(ids, priority=INTERACTIVE, projection="card", key="id"):
+    fields = selection(projection) if key == "id" else f"{key} {selection(projection)}"
+    query = f"""
+    query ($ids: [Int], $perPage: Int) {{
+      Page(page: 1, perPage: $perPage) {{
+        media({key}_in: $ids, type: ANIME) {{ {fields} }}
+      }}
+    }}
     """
-    data = await anilist_request(query, {"id": anime_id})
-    if not data:
-        return None
+    data = await anilist_request(query, {"ids": ids, "perPage": len(ids)}, priority, f"{key}_in")
+    return data["Page"]["media"] if data else []
+
 
-    media = data["Media"]
-    media["description"] = clean_description(media.get("description"))
-    return media
+# Fetches many anime in id_in pages of 50 at a time, returned as {id: media}.
+# key="idMal" looks them up by MyAnimeList id instead, keyed the same way.
+async def search_anime_by_ids(ids, concurrency: int = 4, priority=INTERACTIVE, projection="card", key="id"):
+    ids = list(dict.fromkeys(ids))
+    chunks = [ids[i:i + ID_PAGE_SIZE] for i in range(0, len(ids), ID_PAGE_SIZE)]
+    sem = asyncio.Semaphore(max(1, concurrency))
 
+    async def fetch(chunk):
+        async with sem:
+            return await _search_page_by_ids(chunk, priority, projection, key)
 
-async def get_seasonal_anime(season: str, year: int, page: int = 1, per_page: int = 50):
+    pages = await asyncio.gather(*(fetch(c) for c in chunks))
+    return {m[key]: m for page in pages for m in page}
+
+
+# Yields a user's anime list a chunk of up to 500 entries at a time, each as
+# {"status", "progress", "media"}. Raises ValueError if the list can't be read
+# (unknown user, private list, AniList down).
+async def iter_user_list(username, priority=INTERACTIVE, projection="titles"):
+    query = f"""
+    query ($userName: String, $chunk: Int, $perChunk: Int) {{
+      MediaListCollection(userName: $userName, type: ANIME, chunk: $chunk, perChunk: $perChunk) {{
+        hasNextChunk
+        lists {{ entries {{ status progress media {{ {selection(projection)} }} }} }}
+      }}
+    }}
+    """
+    chunk = 1
+    while True:
+        data = await anilist_request(query, {
+            "userName": username, "chunk": chunk, "perChunk": LIST_CHUNK_SIZE,
+        }, priority, "user_list")
+        if not data or not data.get("MediaListCollection"):
+            raise ValueError(f"Couldn't read {username}'s AniList list.")
+        collection = data["MediaListCollection"]
+        yield [e for lst in collection.get("lists") or () for e in lst.get("entries") or ()]
+        if not collection.get("hasNextChunk"):
+            return
+        chunk += 1
+
+
+async def _seasonal_page(season: str, year: int, page: int, per_page: int = 50, priority=INTERACTIVE):
     query = """
     query ($season: MediaSeason, $seasonYear: Int, $page: Int, $perPage: Int) {
       Page(page: $page, perPage: $perPage) {
+        pageInfo { hasNextPage lastPage }
         media(
           season: $season,
           seasonYear: $seasonYear,
@@ -116,7 +277,8 @@ async def get_seasonal_anime(season: str, year: int, page: int = 1, per_page: in
           sort: POPULARITY_DESC
         ) {
           id
-          title { romaji }
+          title { romaji english }
+          synonyms
           description(asHtml: false)
           genres
           episodes
@@ -131,13 +293,30 @@ async def get_seasonal_anime(season: str, year: int, page: int = 1, per_page: in
         "seasonYear": year,
         "page": page,
         "perPage": per_page
-    })
+    }, priority, "seasonal")
 
     if not data:
-        return []
+        return None, {}
+    return data["Page"]["media"], data["Page"].get("pageInfo") or {}
+
+
+# Yields (page, media) for the whole season: page 1 first, then the remaining
+# pages fetched concurrently in whatever order they complete. media is None
+# for a page that failed; pages past it are only followed if a later one says so.
+async def iter_seasonal_anime(season: str, year: int, priority=INTERACTIVE):
+    media, info = await _seasonal_page(season, year, 1, priority=priority)
+    yield 1, media
+
+    last = 1
+    while info.get("hasNextPage") and last < MAX_SEASON_PAGES:
+        # lastPage is only an estimate, so keep following hasNextPage past it
+        upto = min(max(info.get("lastPage") or 0, last + 1), MAX_SEASON_PAGES)
 
-    media = data["Page"]["media"]
-    for a in media:
-        a["description"] = clean_description(a.get("description"), 250)
+        async def fetch(page):
+            return page, *await _seasonal_page(season, year, page, priority=priority)
 
-    return media
+        infos = {}
+        for done in asyncio.as_completed([fetch(p) for p in range(last + 1, upto + 1)]):
+            page, media, infos[page] = await done
+            yield page, media
+        last, info = upto, infos[upto]
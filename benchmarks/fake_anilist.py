@@ -0,0 +1,124 @@
+# Local stand-in for graphql.anilist.co. It answers the Media/Page queries in
+# anilist.py from an in-memory set of media, with adjustable latency and 429
+# injection, and counts every request it serves.
+#
+#   python -m benchmarks.fake_anilist [--port 8765] [--anime 500] [--latency-ms 80] [--rate-429 0.05]
+#
+# Point the bot at it with ANILIST_API_URL=http://127.0.0.1:8765/
+import argparse
+import asyncio
+import random
+from collections import Counter
+from aiohttp import web
+from benchmarks.synthetic import make_media
+
+
+class FakeAniList:
+    def __init__(self, media, latency=0.0, rate_429=0.0, retry_after=1, rate_limit=90):
+        self.media = {m["id"]: m for m in media}
+        self.latency = latency
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.rate_limit = rate_limit
+        self.requests = 0
+        self.throttled = 0
+        self.by_kind = Counter()
+        self._runner = None
+
+    # ---------------- SERVER ----------------
+    async def start(self, host="127.0.0.1", port=0):
+        app = web.Application()
+        app.router.add_post("/", self.handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        return f"http://{host}:{port}/"
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    def _headers(self, remaining):
+        return {"X-RateLimit-Limit": str(self.rate_limit), "X-RateLimit-Remaining": str(remaining)}
+
+    async def handle(self, request):
+        self.requests += 1
+        body = await request.json()
+        if self.latency:
+            await asyncio.sleep(self.latency * random.uniform(0.5, 1.5))
+
+        if random.random() < self.rate_429:
+            self.throttled += 1
+            headers = {**self._headers(0), "Retry-After": str(self.retry_after)}
+            return web.json_response(
+                {"errors": [{"message": "Too Many Requests.", "status": 429}], "data": None},
+                status=429, headers=headers,
+            )
+
+        kind, data = self.resolve(body["query"], body.get("variables") or {})
+        self.by_kind[kind] += 1
+        if data is None:
+            return web.json_response(
+                {"errors": [{"message": "Not Found.", "status": 404}], "data": {"Media": None}},
+                status=404, headers=self._headers(self.rate_limit),
+            )
+        return web.json_response({"data": data}, headers=self._headers(self.rate_limit))
+
+    # ---------------- QUERIES ----------------
+    def resolve(self, query, variables):
+        if "idMal_in" in query:
+            by_mal = {m["idMal"]: m for m in self.media.values()}
+            found = [self._public(by_mal[i], query) for i in variables["ids"] if i in by_mal]
+            return "idMal_in", self._page(found, 1, len(found) or 1)
+        if "id_in" in query:
+            found = [self._public(self.media[i], query) for i in variables["ids"] if i in self.media]
+            return "id_in", self._page(found, 1, len(found) or 1)
+        if "seasonYear" in query:
+            season, year = variables["season"], variables["seasonYear"]
+            found = [self._public(m, query) for m in self.media.values()
+                     if m["_season"] == season and m["_year"] == year]
+            return "seasonal", self._page(found, variables.get("page", 1), variables.get("perPage", 50))
+        if "Media(search" in query:
+            needle = variables["search"].lower()
+            match = next((m for m in self.media.values() if needle in m["title"]["romaji"].lower()), None)
+            return "search", {"Media": self._public(match, query)} if match else None
+        if "Media(id" in query:
+            match = self.media.get(variables["id"])
+            return "by_id", {"Media": self._public(match, query)} if match else None
+        return "unknown", None
+
+    @staticmethod
+    def _page(items, page, per_page):
+        start = (page - 1) * per_page
+        last = max(1, -(-len(items) // per_page))
+        return {"Page": {
+            "pageInfo": {"hasNextPage": page < last, "lastPage": last},
+            "media": items[start:start + per_page],
+        }}
+
+    # Only the fields the query selects, like the real API
+    @staticmethod
+    def _public(media, query):
+        return {k: v for k, v in media.items() if not k.startswith("_") and (k == "id" or k in query)}
+
+
+async def serve(args):
+    server = FakeAniList(make_media(args.anime), args.latency_ms / 1000, args.rate_429, rate_limit=args.rate_limit)
+    url = await server.start(port=args.port)
+    print(f"Fake AniList serving {args.anime} anime at {url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--anime", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=80)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=int, default=90, help="requests per minute to advertise")
+    asyncio.run(serve(parser.parse_args()))
@@ -0,0 +1,72 @@
+# Prints EXPLAIN ANALYZE plans for the tracked_anime hot queries against a
+# synthetic table of --rows rows spread over --users users.
+#
+#   DATABASE_URL=... python -m benchmarks.query_plans [--rows 100000] [--users 1000] [--no-indexes]
+#
+# Everything runs in one transaction that is rolled back, so it is safe to point
+# at a dev database. --no-indexes drops the migration 2 indexes first to show
+# the plans the bot had before them. Postgres only.
+import argparse
+import asyncio
+import database
+from storage.base import list_page_sql, COUNT_BY_STATUS_SQL
+
+SEED = """
+    INSERT INTO tracked_anime (user_id, anime_id, anime_name, alias, last_watched, last_notified, status)
+    SELECT -1 - (i % $2), i, 'Anime ' || i, 'A' || i, i % 24, i % 24,
+           (ARRAY['watching', 'watched', 'want_to_watch'])[1 + i % 3]::watch_status
+    FROM generate_series(1, $1) AS i
+"""
+
+INDEXES = ["tracked_anime_user_alias", "tracked_anime_user_name",
+           "tracked_anime_user_status_name", "tracked_anime_anime_id"]
+
+# (label, sql, args) with user -1 and anime 1 from the seeded data
+QUERIES = [
+    ("get_progress", """
+        SELECT anime_name, alias, last_watched, anime_id, status
+        FROM tracked_anime
+        WHERE user_id = $1 AND (alias = $2 OR anime_name = $2)
+    """, (-2, "A1")),
+    ("get_aliases", "SELECT alias FROM tracked_anime WHERE user_id = $1", (-2,)),
+    ("list page", list_page_sql(None, lambda n: f"${n}"), (-2, "watching", 10)),
+    ("list page after a row", list_page_sql(("after", 1), lambda n: f"${n}"), (-2, "watching", 10, 1001)),
+    ("list counts by status", COUNT_BY_STATUS_SQL.format("$1"), (-2,)),
+    ("get_trackers", """
+        SELECT user_id, last_notified
+        FROM tracked_anime
+        WHERE anime_id = $1 AND status <> 'watched'
+    """, (1,)),
+]
+
+
+async def main(rows, users, drop_indexes):
+    await database.init_db()
+    if database.backend.name != "postgres":
+        raise SystemExit("query_plans needs a postgres:// DATABASE_URL")
+    async with database.backend.pool.acquire() as conn:
+        tr = conn.transaction()
+        await tr.start()
+        try:
+            if drop_indexes:
+                for name in INDEXES:
+                    await conn.execute(f"DROP INDEX {name}")
+            await conn.execute(SEED, rows, users)
+            await conn.execute("ANALYZE tracked_anime")
+            print(f"tracked_anime: {rows} synthetic rows over {users} users, "
+                  f"indexes {'dropped' if drop_indexes else 'present'}\n")
+            for label, sql, args in QUERIES:
+                plan = await conn.fetch(f"EXPLAIN (ANALYZE, BUFFERS) {sql}", *args)
+                print(f"---- {label}")
+                print("\n".join(r[0] for r in plan), end="\n\n")
+        finally:
+            await tr.rollback()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=1_000)
+    parser.add_argument("--no-indexes", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.users, args.no_indexes))
@@ -0,0 +1,212 @@
+# End-to-end benchmark of the notifier and the hot slash commands. It runs the
+# real handlers against the fake AniList server, a synthetic data set and
+# stubbed Discord objects, and reports wall time, p50/p99 latency, AniList
+# requests and database round trips for each driver.
+#
+#   [DATABASE_URL=... DB_SSL=disable] python -m benchmarks.run \
+#       [--users 200] [--anime 500] [--per-user 40] [--ops 200] [--latency-ms 80] [--rate-429 0.0] [--cold]
+#
+# Without DATABASE_URL it runs against an in-memory SQLite database. Synthetic
+# rows use negative user ids and are deleted again afterwards.
+import argparse
+import asyncio
+import os
+import random
+import time
+
+os.environ.setdefault("DISCORD_TOKEN", "benchmark")
+os.environ.setdefault("DATABASE_URL", "sqlite://:memory:")
+
+import anilist
+import cache
+import database
+import importer
+import bot as bot_module
+from benchmarks import synthetic
+from benchmarks.fake_anilist import FakeAniList
+from benchmarks.stubs import FakeGuild, FakeInteraction
+
+
+def percentile(samples, p):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+class Driver:
+    def __init__(self, ctx, name):
+        self.ctx = ctx
+        self.name = name
+        self.samples = []
+
+    async def __aenter__(self):
+        if self.ctx.args.cold:
+            cache.media_cache.clear()
+        self._requests = self.ctx.server.requests
+        self._throttled = self.ctx.server.throttled
+        self._round_trips = database.pool_stats()["acquire"]["count"]
+        self._start = time.perf_counter()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.ctx.results.append((
+            self.name, len(self.samples), time.perf_counter() - self._start,
+            percentile(self.samples, 50) * 1000, percentile(self.samples, 99) * 1000,
+            self.ctx.server.requests - self._requests, self.ctx.server.throttled - self._throttled,
+            database.pool_stats()["acquire"]["count"] - self._round_trips,
+        ))
+
+    async def run(self, make_op, ops, concurrency):
+        sem = asyncio.Semaphore(concurrency)
+
+        async def one(i):
+            async with sem:
+                start = time.perf_counter()
+                await make_op(i)
+                self.samples.append(time.perf_counter() - start)
+
+        await asyncio.gather(*(one(i) for i in range(ops)))
+
+
+class Context:
+    def __init__(self, args, server, media, rows):
+        self.args = args
+        self.server = server
+        self.media = media
+        self.rows = rows
+        self.rng = random.Random(1)
+        self.results = []
+
+    def random_row(self):
+        return self.rng.choice(self.rows)
+
+
+# ---------------- DRIVERS ----------------
+async def drive_notifier(ctx):
+    guild = FakeGuild(cached=not ctx.args.low_memory_members)
+    bot_module.notifier_guilds = lambda: [guild]
+    bot_module.member_resolver.low_memory = ctx.args.low_memory_members
+    expected = synthetic.expected_notifications(ctx.media, ctx.rows)
+    bot_module.owned_partitions = await database.rebalance_partitions(bot_module.NOTIFIER_PARTITIONS)
+    async with Driver(ctx, f"check_new_episodes ({expected} due)") as d:
+        start = time.perf_counter()
+        await bot_module.check_new_episodes()
+        deadline = time.perf_counter() + 120
+        while guild.dms < expected and time.perf_counter() < deadline:
+            await asyncio.sleep(0.01)
+        d.samples.append(time.perf_counter() - start)
+    bot_module.airing_scheduler.stop()
+    if guild.dms < expected:
+        print(f"⚠️ notifier sent {guild.dms}/{expected} DMs before the deadline")
+    if guild.member_queries:
+        print(f"notifier resolved members with {guild.member_queries} member queries")
+
+
+async def drive_list(ctx):
+    async with Driver(ctx, "list_cmd") as d:
+        await d.run(lambda i: bot_module.list_cmd.callback(FakeInteraction(ctx.random_row()[0])),
+                    ctx.args.ops, ctx.args.concurrency)
+
+
+async def drive_progress(ctx):
+    async def op(i):
+        row = ctx.random_row()
+        await bot_module.progress.callback(FakeInteraction(row[0]), row[3])
+    async with Driver(ctx, "progress") as d:
+        await d.run(op, ctx.args.ops, ctx.args.concurrency)
+
+
+# Bursts of /watched on a few rows, as when a user binges; set WRITE_BEHIND_MS
+# to see them coalesce
+async def drive_watched(ctx):
+    binge = [ctx.random_row() for _ in range(5)]
+    async def op(i):
+        row = ctx.rng.choice(binge)
+        await bot_module.watched.callback(FakeInteraction(row[0]), row[3])
+    async with Driver(ctx, "watched burst") as d:
+        await d.run(op, ctx.args.ops, ctx.args.concurrency)
+        await database.flush_writes()
+
+
+async def drive_autocomplete(ctx):
+    async def op(i):
+        row = ctx.random_row()
+        await bot_module.alias_autocomplete(FakeInteraction(row[0]), row[3][:ctx.rng.randint(0, 3)])
+    async with Driver(ctx, "alias_autocomplete") as d:
+        await d.run(op, ctx.args.ops, ctx.args.concurrency)
+
+
+async def drive_track_autocomplete(ctx):
+    await cache.warm_title_index()
+    async def op(i):
+        title = ctx.random_row()[2]
+        await bot_module.anime_autocomplete(FakeInteraction(0), title[:ctx.rng.randint(3, len(title))])
+    async with Driver(ctx, "track autocomplete") as d:
+        await d.run(op, ctx.args.ops, ctx.args.concurrency)
+
+
+# A fresh user imports a MAL export listing every synthetic anime
+async def drive_import(ctx):
+    user_id = -(ctx.args.users + 1)
+    export = synthetic.make_mal_export(ctx.media)
+    async def chunks():
+        for i in range(0, len(export), importer.READ_CHUNK):
+            yield export[i:i + importer.READ_CHUNK]
+    async def report(text):
+        pass
+    async with Driver(ctx, f"import ({len(ctx.media)} MAL entries)") as d:
+        start = time.perf_counter()
+        entries, _ = await importer.mal_entries(chunks(), report, bot_module.ANILIST_CONCURRENCY)
+        await bot_module.run_import(user_id, entries, report)
+        d.samples.append(time.perf_counter() - start)
+    await synthetic.clear_database([(user_id, m["id"]) for m in ctx.media])
+
+
+DRIVERS = [drive_notifier, drive_list, drive_progress, drive_watched, drive_autocomplete, drive_track_autocomplete,
+           drive_import]
+
+
+def report(ctx):
+    header = ("driver", "ops", "wall s", "p50 ms", "p99 ms", "anilist", "429s", "db trips")
+    print("{:<34}{:>6}{:>9}{:>9}{:>9}{:>9}{:>6}{:>10}".format(*header))
+    for name, ops, wall, p50, p99, requests, throttled, trips in ctx.results:
+        print(f"{name:<34}{ops:>6}{wall:>9.2f}{p50:>9.1f}{p99:>9.1f}{requests:>9}{throttled:>6}{trips:>10}")
+
+
+async def main(args):
+    media = synthetic.make_media(args.anime, args.due_fraction)
+    server = FakeAniList(media, args.latency_ms / 1000, args.rate_429, rate_limit=args.rate_limit)
+    anilist.API_URL = await server.start()
+    await database.init_db()
+    rows = synthetic.make_tracked(media, args.users, args.per_user)
+    await synthetic.seed_database(rows)
+    await database.refresh_trackers()  # as setup_hook does
+    ctx = Context(args, server, media, rows)
+    print(f"{args.users} users x {args.per_user} anime ({len(rows)} rows) over {args.anime} anime "
+          f"on {database.backend.name}, AniList latency {args.latency_ms}ms, 429 rate {args.rate_429}\n")
+    try:
+        for driver in DRIVERS:
+            await driver(ctx)
+        report(ctx)
+    finally:
+        await synthetic.clear_database(rows)
+        await (await anilist.get_session()).close()
+        await server.stop()
+        await database.close_db()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--anime", type=int, default=500)
+    parser.add_argument("--per-user", type=int, default=40)
+    parser.add_argument("--ops", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--due-fraction", type=float, default=0.1)
+    parser.add_argument("--latency-ms", type=float, default=80)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=int, default=90, help="AniList requests per minute")
+    parser.add_argument("--cold", action="store_true", help="clear the media cache before each driver")
+    parser.add_argument("--low-memory-members", action="store_true", help="resolve members with query_members")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,102 @@
+# Minimal stand-ins for the discord.py objects the commands and the notifier
+# touch. They record what the bot sends instead of calling Discord.
+
+
+class FakeUser:
+    def __init__(self, user_id, sink=None):
+        self.id = user_id
+        self.display_name = f"user{user_id}"
+        self.mention = f"<@{user_id}>"
+        self.roles = []
+        self._sink = sink
+
+    async def send(self, content=None, **kwargs):
+        if self._sink is not None:
+            self._sink.dms += 1
+
+
+class FakeChannel:
+    def __init__(self, sink):
+        self._sink = sink
+
+    def permissions_for(self, member):
+        return type("Permissions", (), {"send_messages": True})()
+
+    async def send(self, content=None, **kwargs):
+        self._sink.channel_messages += 1
+
+
+# Every user is a member. With cached=False get_member() misses, like a bot
+# running without a member cache, and query_members() has to be used instead.
+class FakeGuild:
+    def __init__(self, guild_id=1, shard_id=0, cached=True):
+        self.id = guild_id
+        self.shard_id = shard_id
+        self.me = FakeUser(0)
+        self.dms = 0
+        self.channel_messages = 0
+        self.member_queries = 0
+        self.text_channels = [FakeChannel(self)]
+        self.cached = cached
+        self._members = {}
+
+    def _member(self, user_id):
+        if user_id not in self._members:
+            self._members[user_id] = FakeUser(user_id, self)
+        return self._members[user_id]
+
+    def get_member(self, user_id):
+        return self._member(user_id) if self.cached else None
+
+    async def query_members(self, user_ids, limit=5, cache=True):
+        self.member_queries += 1
+        return [self._member(u) for u in user_ids]
+
+    def get_role(self, role_id):
+        return None
+
+    def get_channel(self, channel_id):
+        return None
+
+
+class FakeMessage:
+    async def edit(self, **kwargs):
+        pass
+
+
+class FakeResponse:
+    def __init__(self):
+        self._done = False
+
+    def is_done(self):
+        return self._done
+
+    async def defer(self, **kwargs):
+        self._done = True
+
+    async def send_message(self, *args, **kwargs):
+        self._done = True
+
+    async def edit_message(self, **kwargs):
+        self._done = True
+
+
+class FakeFollowup:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, content=None, **kwargs):
+        self.sent.append(content or kwargs.get("embed"))
+        return FakeMessage()
+
+
+class FakeInteraction:
+    def __init__(self, user_id, guild_id=1):
+        self.user = FakeUser(user_id)
+        self.guild_id = guild_id
+        self.response = FakeResponse()
+        self.followup = FakeFollowup()
+        self.extras = {}
+
+    async def edit_original_response(self, **kwargs):
+        pass
@@ -0,0 +1,96 @@
+# Synthetic AniList media and tracked_anime rows for N users x M anime.
+# Synthetic users get negative ids and anime ids start at ANIME_ID_BASE, so a
+# run can share a database with real data and remove its rows afterwards.
+import asyncio
+import random
+import time
+import database
+
+ANIME_ID_BASE = 9_000_000
+MAL_ID_BASE = 8_000_000
+SEASONS = ["WINTER", "SPRING", "SUMMER", "FALL"]
+GENRES = ["Action", "Adventure", "Comedy", "Drama", "Fantasy", "Romance", "Slice of Life", "Sci-Fi"]
+WORDS = ["Blade", "Spirit", "Academy", "Chronicle", "Sky", "Dragon", "Moon", "Hero", "Shadow", "Garden"]
+STATUSES = ["watching", "watched", "want_to_watch"]
+
+
+def make_media(count, due_fraction=0.1, seed=0, year=2026):
+    rng = random.Random(seed)
+    now = int(time.time())
+    media = []
+    for i in range(count):
+        anime_id = ANIME_ID_BASE + i
+        episode = rng.randint(2, 12)
+        # Due episodes aired a minute ago, the rest air over the next week
+        airing_at = now - 60 if rng.random() < due_fraction else now + rng.randint(3600, 7 * 86400)
+        media.append({
+            "id": anime_id,
+            "idMal": MAL_ID_BASE + i,
+            "title": {"romaji": f"{rng.choice(WORDS)} {rng.choice(WORDS)} {i}"},
+            "description": "<p>Synthetic <b>benchmark</b> anime.</p>" * 3,
+            "coverImage": {"large": f"https://img.invalid/{anime_id}/l.jpg",
+                           "medium": f"https://img.invalid/{anime_id}/m.jpg", "color": "#aabbcc"},
+            "genres": rng.sample(GENRES, 3),
+            "episodes": 12,
+            "nextAiringEpisode": {"episode": episode, "airingAt": airing_at},
+            "_season": SEASONS[i % 4],
+            "_year": year,
+        })
+    return media
+
+
+# (user_id, anime_id, anime_name, alias, last_watched, last_notified, status)
+def make_tracked(media, users, per_user, seed=0):
+    rng = random.Random(seed)
+    rows = []
+    for u in range(users):
+        for m in rng.sample(media, min(per_user, len(media))):
+            ep = m["nextAiringEpisode"]["episode"]
+            rows.append((
+                -(u + 1), m["id"], m["title"]["romaji"], f"S{m['id'] - ANIME_ID_BASE}",
+                ep - 1, ep - 1, rng.choice(STATUSES),
+            ))
+    return rows
+
+
+# A MyAnimeList XML export listing the given media
+def make_mal_export(media, seed=0):
+    rng = random.Random(seed)
+    statuses = ["Watching", "Completed", "On-Hold", "Dropped", "Plan to Watch"]
+    entries = "".join(
+        f"<anime><series_animedb_id>{m['idMal']}</series_animedb_id>"
+        f"<series_title><![CDATA[{m['title']['romaji']}]]></series_title>"
+        f"<my_watched_episodes>{rng.randint(0, 12)}</my_watched_episodes>"
+        f"<my_status>{rng.choice(statuses)}</my_status></anime>"
+        for m in media
+    )
+    return f'<?xml version="1.0" encoding="UTF-8" ?><myanimelist>{entries}</myanimelist>'.encode()
+
+
+# Notifications the bot should send for rows tracking a due episode
+def expected_notifications(media, rows, now=None):
+    now = now or time.time()
+    due = {m["id"]: m["nextAiringEpisode"]["episode"] for m in media
+           if m["nextAiringEpisode"]["airingAt"] <= now}
+    return sum(1 for r in rows if r[1] in due and r[6] != "watched" and r[5] < due[r[1]])
+
+
+async def seed_database(rows, concurrency=8):
+    await clear_database(rows)
+    sem = asyncio.Semaphore(concurrency)
+
+    async def add(user_id, anime_id, name, alias, watched, notified, status):
+        async with sem:
+            await database.add_anime(user_id, anime_id, name, alias, watched, status)
+    await asyncio.gather(*(add(*r) for r in rows))
+
+
+# Goes through the public API so it works on every storage backend; the
+# anime_media rows stay behind as ordinary cache entries
+async def clear_database(rows, concurrency=8):
+    sem = asyncio.Semaphore(concurrency)
+
+    async def remove(user_id, anime_id):
+        async with sem:
+            await database.remove_anime(user_id, anime_id)
+    await asyncio.gather(*(remove(r[0], r[1]) for r in rows))
@@ -3,20 +3,40 @@ from discord import app_commands
 from discord.ext import commands, tasks
 import os
 import math
+import time
+import json
+import hashlib
+import asyncio
 from dotenv import load_dotenv
-from datetime import datetime, timezone, timedelta
-from zoneinfo import ZoneInfo
-from keep_alive import keep_alive
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from collections import defaultdict
+from keep_alive import KeepAlive
 from database import *
 from anilist import *
+from scheduler import AiringScheduler
+from members import member_resolver, LOW_MEMORY_MEMBERS
+from tracker_index import tracker_index
+from title_index import title_index
+from importer import attachment_chunks, mal_entries, anilist_entries
+from cache import *
+from metrics import observe_command, mark_sweep, monitor_loop_lag, startup_phase, startup_phases, NOTIFIER_SWEEP_SECONDS, NOTIFIER_ROWS_SCANNED, NOTIFICATIONS_SENT
 
 
 # ---------------- CONFIGURATION ----------------
 load_dotenv()
 TOKEN=os.getenv("DISCORD_TOKEN")
-GUILD_ID=int(os.getenv("GUILD_ID"))
+GUILD_ID=int(os.getenv("GUILD_ID") or 0) or None  # optional; ALERT_ROLE_ID applies there unless /config sets a role
 ALERT_ROLE_ID=int(os.getenv("ALERT_ROLE_ID") or 0) or None
+SHARD_COUNT=int(os.getenv("SHARD_COUNT") or 0) or None  # unset: ask Discord
+SHARD_IDS=[int(s) for s in os.getenv("SHARD_IDS","").split(",") if s.strip()] or None  # unset: every shard
+SHARD_GROUP=min(SHARD_IDS) if SHARD_IDS else 0  # processes serving the same shards split the notifier
 TIMEZONE=os.getenv("TIMEZONE","America/New_York"); ITEMS_PER_PAGE=10
+ANILIST_CONCURRENCY=int(os.getenv("ANILIST_CONCURRENCY") or 4)
+NOTIFY_CONCURRENCY=int(os.getenv("NOTIFY_CONCURRENCY") or 10)
+NOTIFIER_PARTITIONS=int(os.getenv("NOTIFIER_PARTITIONS") or 16)
+REBALANCE_INTERVAL=int(os.getenv("REBALANCE_INTERVAL") or 30)
+FORCE_SYNC=os.getenv("FORCE_SYNC","").lower() in ("1","true","yes")  # sync commands even if unchanged
 
 
 GENRE_EMOJIS = {
@@ -27,59 +47,135 @@ GENRE_EMOJIS = {
 
 SEASONS = ["WINTER", "SPRING", "SUMMER", "FALL"]
 
-# Cache AniList lookups for 10 minutes to reduce API latency
-anime_cache = {}
-CACHE_TTL = 600 
+# The scheduler needs live airing data, so it skips the cache but refreshes it
+async def fetch_airing(anime_ids):
+    fetched=await search_anime_by_ids(anime_ids,concurrency=ANILIST_CONCURRENCY,priority=BACKGROUND,projection="airing")
+    remember(fetched.values())
+    return fetched
 
-async def cached_search_id(anime_id):
-    now=datetime.now().timestamp()
-    if (c:=anime_cache.get(anime_id)) and now-c[1]<CACHE_TTL:
-        return c[0]
-    data=await search_anime_by_id(anime_id)
-    anime_cache[anime_id]=(data,now)
-    return data
+async def guild_timezone(guild_id):
+    tz=(await get_guild_config(guild_id))["timezone"] if guild_id else None
+    return ZoneInfo(tz or TIMEZONE)
 
-def current_season_year():
-    now=datetime.now(ZoneInfo(TIMEZONE))
+def current_season_year(tz=None):
+    now=datetime.now(tz or ZoneInfo(TIMEZONE))
     m,y=now.month,now.year
     return ("WINTER",y) if m<=3 else ("SPRING",y) if m<=6 else ("SUMMER",y) if m<=9 else ("FALL",y)
 
 def format_genres(genres): return " ".join(GENRE_EMOJIS[g] for g in genres if g in GENRE_EMOJIS)
 
+# Title initials, numbered when the user already has that alias
+def default_alias(title,taken):
+    base=alias="".join(w[0] for w in title.split() if w).upper()
+    n=2
+    while alias in taken: alias,n=f"{base}{n}",n+1
+    return alias
+
 
 # ---------------- BOT SETUP ----------------
-class MyBot(commands.Bot):
+# Stamps every interaction so command latency can be observed when it completes
+class TimedTree(app_commands.CommandTree):
+    async def interaction_check(self, interaction):
+        interaction.extras["started"] = time.perf_counter()
+        if isinstance(interaction.user, discord.Member):  # free, fresh member data for the notifier
+            member_resolver.remember(interaction.guild_id, interaction.user.id, interaction.user)
+        return True
+
+    async def on_error(self, interaction, error):
+        observe_interaction(interaction, "error")
+        await super().on_error(interaction, error)
+
+def observe_interaction(interaction, outcome):
+    if (started := interaction.extras.get("started")) is not None and interaction.command:
+        observe_command(interaction.command.qualified_name, outcome, started, interaction.extras.get("deferred"))
+
+# Defers and remembers when, for the defer-to-followup histogram
+async def defer(interaction, **kwargs):
+    interaction.extras["deferred"] = time.perf_counter()
+    await interaction.response.defer(**kwargs)
+
+class MyBot(commands.AutoShardedBot):
     def __init__(self):
         intents = discord.Intents.default()
         intents.members = intents.message_content = True
-        super().__init__(command_prefix="!", intents=intents)
+        # Low-memory mode keeps only the bot's own member and resolves tracked users on demand
+        member_cache = discord.MemberCacheFlags.none() if LOW_MEMORY_MEMBERS else discord.MemberCacheFlags.from_intents(intents)
+        super().__init__(command_prefix="!", intents=intents, tree_cls=TimedTree,
+                         shard_count=SHARD_COUNT, shard_ids=SHARD_IDS,
+                         chunk_guilds_at_startup=not LOW_MEMORY_MEMBERS, member_cache_flags=member_cache)
+        self.loop_monitor = None
+        self.web = KeepAlive(self)
 
     async def setup_hook(self):
-        await init_db() 
-        print("✅ Database pool initialized.")
-
-        db_pool = await get_conn()
-        async with db_pool.acquire() as conn:
-            await conn.execute("SELECT 1;")
-            print("✅ Database connection test successful!")
-
-        guild = discord.Object(id=GUILD_ID)
-        self.tree.copy_global_to(guild=guild)
-        for name in ("watched", "mark", "untrack", "change_alias", "progress"):
-            cmd = self.tree.get_command(name)
-            if cmd:
-                cmd.autocomplete("identifier")(alias_autocomplete)
-        await self.tree.sync(guild=guild)
-        
-        if not check_new_episodes.is_running(): 
-            check_new_episodes.start()
-        print("✅ Bot synced and tasks started.")
+        with startup_phase("db"):
+            await init_db()
+            print(f"✅ Database initialized, warmed media cache with {await warm_media_cache()} anime.")
+            print(f"✅ Indexed titles of {await warm_title_index()} anime.")
+            await refresh_trackers()
+            print(f"✅ Loaded {len(tracker_index)} notifier trackers.")
+
+        with startup_phase("web"):
+            self.loop_monitor = asyncio.create_task(monitor_loop_lag())
+            await self.web.start()
+
+        self.add_dynamic_items(ListButton, ListStatusSelect, SeasonalButton, SeasonSelect)
+        with startup_phase("sync"):
+            for name in ("watched", "mark", "untrack", "change_alias", "progress"):
+                cmd = self.tree.get_command(name)
+                if cmd:
+                    cmd.autocomplete("identifier")(alias_autocomplete)
+            self.tree.get_command("track").autocomplete("anime")(anime_autocomplete)
+            synced = await self.sync_commands()
+            print("✅ Commands synced." if synced else "✅ Commands unchanged, sync skipped.")
+
+        with startup_phase("tasks"):
+            if not rebalance_notifier.is_running():
+                rebalance_notifier.start()
+            if not check_new_episodes.is_running(): 
+                check_new_episodes.start()
+        print("✅ Startup: " + ", ".join(f"{name} {s * 1000:.0f}ms" for name, s in startup_phases.items()))
+
+    # Syncs only when the serialized command tree differs from the last synced one
+    async def sync_commands(self):
+        payload = {"commands": [cmd.to_dict(self.tree) for cmd in self.tree.get_commands()], "guild": GUILD_ID}
+        digest = hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+        key = f"command_tree:{self.application_id}"
+        if not FORCE_SYNC and await get_meta(key) == digest:
+            return False
+        if GUILD_ID:
+            # Commands are global now; drop the guild-only copies earlier versions synced
+            guild = discord.Object(id=GUILD_ID)
+            self.tree.clear_commands(guild=guild)
+            await self.tree.sync(guild=guild)
+        await self.tree.sync()
+        await set_meta(key, digest)
+        return True
+
+    async def close(self):
+        airing_scheduler.stop()
+        if self.loop_monitor: self.loop_monitor.cancel()
+        await self.web.stop()
+        await super().close()
+        await close_db()
 bot = MyBot()
 
 @bot.event
 async def on_ready():
     print(f"Logged in as {bot.user}")
 
+@bot.event
+async def on_app_command_completion(interaction, command):
+    observe_interaction(interaction, "ok")
+
+# A join overrides a cached "not in this guild", which would otherwise hold for MEMBER_ABSENT_TTL
+@bot.event
+async def on_member_join(member):
+    member_resolver.remember(member.guild.id, member.id, member)
+
+@bot.event
+async def on_raw_member_remove(payload):
+    member_resolver.forget(payload.guild_id, payload.user.id)
+
 GOJO_GIF_URL = "https://giphy.com/gifs/jujutsu-kaisen-kilianirl-WDH0KOD68mVzqTrfFr"
 
 @bot.event
@@ -92,225 +188,225 @@ async def on_message(message):
     await bot.process_commands(message)
 
 # ---------------- UI COMPONENTS ----------------
-class ListView(discord.ui.View):
-    def __init__(self, owner, rows, status="watching", page=0):
-        super().__init__(timeout=180)
-        self.owner = owner
-        self.rows = rows
-        self.status = status
-        self.page = page
-        self.preview_mode = False
-        self.preview_index = 0
-        self.update_controls()
-
-    def get_filtered(self):
-        return [r for r in self.rows if r[3] == self.status]
-    def max_pages(self):
-        return max(1, math.ceil(len(self.get_filtered()) / ITEMS_PER_PAGE))
-    def page_rows(self):
-        start = self.page * ITEMS_PER_PAGE
-        return self.get_filtered()[start:start + ITEMS_PER_PAGE]
-    def build_list_embed(self):
-        items = [f"**{n}** (`{a}`) → Ep {e}" for n, a, e, _ in self.page_rows()]
-        embed = discord.Embed(
-            title=f"📺 {self.owner.display_name}'s {self.status.replace('_', ' ').title()} List",
-            description="\n".join(items) if items else "No anime here.",
-            color=0x9b59b6,
-        )
-        embed.set_footer(text=f"Page {self.page + 1}/{self.max_pages()}")
-        return embed
-    async def build_preview_embed(self):
-        rows = self.page_rows()
-        if not rows:
-            return discord.Embed(title="Preview", description="No anime to preview.", color=0x9b59b6)
-        name, alias, ep, _ = rows[self.preview_index]
-        prog = await get_progress(self.owner.id, alias)
-        if not prog:
-            return discord.Embed(title="Preview", description=f"Not tracking {name}.", color=0x9b59b6)
-
-        # Use cached ID search for speed
-        data = await cached_search_id(prog[3])
+# The list and seasonal messages keep no state in the bot: whose list, which
+# status or season, the page and the preview index (-1 for the list itself) are
+# encoded in each component's custom_id, and a click rebuilds just the page it
+# needs from the database and the media caches. Registered in setup_hook, so
+# buttons keep working across restarts and on any replica.
+LIST_STATUSES = [("Watching", "watching", "📺"), ("Watched", "watched", "✅"), ("Want to Watch", "want_to_watch", "⭐")]
+
+
+# Applies a pager button to (page, preview)
+def step(action, page, preview):
+    if action == "zoom": return page, -1 if preview >= 0 else 0
+    delta = -1 if action == "prev" else 1
+    return (page, preview + delta) if preview >= 0 else (page + delta, preview)
+
+
+def pager_buttons(item, state, page, pages, preview, count):
+    previewing = preview >= 0
+    for action, label, style, disabled in (
+        ("prev", "◀", discord.ButtonStyle.gray, preview == 0 if previewing else page == 0),
+        ("next", "▶", discord.ButtonStyle.gray, preview >= count - 1 if previewing else page >= pages - 1),
+        ("zoom", "↩️" if previewing else "🔍", discord.ButtonStyle.blurple, not count),
+    ):
+        yield item(action, *state, page, preview, label=label, style=style, disabled=disabled)
+
+
+def pager_view(select, buttons):
+    view = discord.ui.View(timeout=None)
+    for item in (select, *buttons): view.add_item(item)
+    return view
+
+
+# A list owner's name, when only their id survived in the custom_id
+async def display_name(interaction, user_id):
+    if user_id == interaction.user.id: return interaction.user.display_name
+    if user := (interaction.guild and interaction.guild.get_member(user_id)) or bot.get_user(user_id):
+        return user.display_name
+    try: return (await bot.fetch_user(user_id)).display_name
+    except discord.HTTPException: return "Unknown user"
+
+
+# (embed, view, {status: count}); list buttons carry the first and last anime_id
+# of their page, and the page they move to is read by keyset from there
+async def list_message(owner_id, owner_name, status, page=0, preview=-1, cursor=None):
+    rows, counts = await list_tracked_page(owner_id, status, ITEMS_PER_PAGE, cursor)
+    if cursor and (not rows or cursor[0] == "before" and len(rows) < ITEMS_PER_PAGE):
+        # The anchor row was removed or rows moved ahead of it; start over
+        page, (rows, counts) = 0, await list_tracked_page(owner_id, status, ITEMS_PER_PAGE)
+    pages = max(1, math.ceil(counts.get(status, 0) / ITEMS_PER_PAGE))
+    page = min(page, pages - 1)
+    preview = min(preview, len(rows) - 1)
+    if preview >= 0:
+        name, _, ep, anime_id = rows[preview]
+        data = await cached_search_id(anime_id, "cover")
         embed = discord.Embed(title=f"📺 {name}", description=f"Episode {ep}", color=0x5865F2)
         if data and data.get("coverImage", {}).get("large"):
             embed.set_image(url=data["coverImage"]["large"])
-        embed.set_footer(text=f"Preview {self.preview_index + 1}/{len(rows)} - Page {self.page + 1}/{self.max_pages()}")
-        return embed
-
-    def update_controls(self):
-        if self.preview_mode:
-            self.prev.disabled = (self.preview_index == 0)
-            self.next.disabled = (self.preview_index >= len(self.page_rows()) - 1)
-        else:
-            self.prev.disabled = (self.page == 0)
-            self.next.disabled = (self.page >= self.max_pages() - 1)
-        self.zoom.label = "↩️" if self.preview_mode else "🔍"
-
-    @discord.ui.select(
-        placeholder="Filter status",
-        options=[
-            discord.SelectOption(label="Watching", value="watching", emoji="📺"),
-            discord.SelectOption(label="Watched", value="watched", emoji="✅"),
-            discord.SelectOption(label="Want to Watch", value="want_to_watch", emoji="⭐"),
-        ],
-    )
-    async def select_status(self, interaction: discord.Interaction, select: discord.ui.Select):
-        self.status = select.values[0]
-        self.page = 0
-        self.preview_mode = False
-        self.update_controls()
-        await interaction.response.edit_message(embed=self.build_list_embed(), view=self)
-
-    @discord.ui.button(label="◀", style=discord.ButtonStyle.gray)
-    async def prev(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if self.preview_mode: self.preview_index -= 1
-        else: self.page -= 1
-        self.update_controls()
-        embed = await self.build_preview_embed() if self.preview_mode else self.build_list_embed()
-        await interaction.response.edit_message(embed=embed, view=self)
-
-    @discord.ui.button(label="▶", style=discord.ButtonStyle.gray)
-    async def next(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if self.preview_mode: self.preview_index += 1
-        else: self.page += 1
-        self.update_controls()
-        embed = await self.build_preview_embed() if self.preview_mode else self.build_list_embed()
-        await interaction.response.edit_message(embed=embed, view=self)
-
-    @discord.ui.button(label="🔍", style=discord.ButtonStyle.blurple)
-    async def zoom(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if not self.page_rows():
-            return await interaction.response.send_message("No anime to preview.", ephemeral=True)
-        self.preview_mode = not self.preview_mode
-        self.preview_index = 0 
-        self.update_controls()
-        embed = await self.build_preview_embed() if self.preview_mode else self.build_list_embed()
-        await interaction.response.edit_message(embed=embed, view=self)
-
-async def seasonal(interaction: discord.Interaction, year:int=None):
-    season, d_year = current_season_year()
-    data = await get_seasonal_anime(season, year or d_year)
-    
-    all_tracked = await get_all_tracked()
-    tracked_ids = {uid[1] for uid in all_tracked if uid[0] == interaction.user.id}
-
-    view = SeasonalView(interaction.user.id, season, year or d_year, data, tracked_ids)
-    await interaction.followup.send(embed=view.build_list_embed(), view=view)
-
-class SeasonalView(discord.ui.View):
-    def __init__(self, user_id, season, year, data, tracked_ids):
-        super().__init__(timeout=180)
-        self.user_id = user_id
-        self.season = season
-        self.year = year
-        self.page = 0
-        self.preview_mode = False
-        self.preview_index = 0
-        self.data = data
-        self.tracked_ids = tracked_ids
-        self.update_controls()
-
-    def max_pages(self):
-        return max(1, math.ceil(len(self.data) / ITEMS_PER_PAGE))
-
-    def page_slice(self):
-        start = self.page * ITEMS_PER_PAGE
-        return self.data[start : start + ITEMS_PER_PAGE]
-
-    def build_list_embed(self):
-        lines = []
-        for a in self.page_slice():
-            mark = "✅ " if a["id"] in self.tracked_ids else ""
-            eps = a.get("episodes") or "?"
-            lines.append(f"{mark}**{a['title']['romaji']}** — {eps} eps")
-
+        embed.set_footer(text=f"Preview {preview + 1}/{len(rows)} - Page {page + 1}/{pages}")
+    else:
+        items = [f"**{n}** (`{a}`) → Ep {e}" for n, a, e, _ in rows]
         embed = discord.Embed(
-            title=f"📡 {self.season.title()} {self.year} Seasonal",
-            description="\n".join(lines) if lines else "No anime found.",
-            color=0xF39C12,
+            title=f"📺 {owner_name}'s {status.replace('_', ' ').title()} List",
+            description="\n".join(items) if items else "No anime here.",
+            color=0x9b59b6,
         )
-        embed.set_footer(text=f"Page {self.page + 1}/{self.max_pages()}")
-        return embed
-
-    def build_preview_embed(self):
-        page = self.page_slice()
-        if not page:
-            return discord.Embed(title="Preview", description="No anime found.", color=0xF39C12)
-
-        a = page[self.preview_index]
+        embed.set_footer(text=f"Page {page + 1}/{pages}")
+    ends = (rows[0][3], rows[-1][3]) if rows else (0, 0)
+    buttons = pager_buttons(ListButton, (owner_id, status, *ends), page, pages, preview, len(rows))
+    return embed, pager_view(ListStatusSelect(owner_id, status, counts), buttons), counts
+
+
+class ListButton(discord.ui.DynamicItem[discord.ui.Button],
+                 template=r"list:(?P<action>prev|next|zoom):(?P<owner>-?\d+):(?P<status>[a-z_]+):(?P<first>-?\d+):(?P<last>-?\d+):(?P<page>\d+):(?P<preview>-?\d+)"):
+    def __init__(self, action, owner_id, status, first, last, page, preview, **button):
+        super().__init__(discord.ui.Button(
+            custom_id=f"list:{action}:{owner_id}:{status}:{first}:{last}:{page}:{preview}", **button))
+        self.action, self.owner_id, self.status, self.page, self.preview = action, owner_id, status, page, preview
+        self.first, self.last = first, last
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(match["action"], int(match["owner"]), match["status"], int(match["first"]), int(match["last"]),
+                   int(match["page"]), int(match["preview"]))
+
+    async def callback(self, interaction):
+        await interaction.response.defer()
+        page, preview = step(self.action, self.page, self.preview)
+        cursor = ("after", self.last) if page > self.page else ("before", self.first) if page < self.page else ("from", self.first)
+        embed, view, _ = await list_message(self.owner_id, await display_name(interaction, self.owner_id), self.status,
+                                            page, preview, cursor)
+        await interaction.edit_original_response(embed=embed, view=view)
+
+
+class ListStatusSelect(discord.ui.DynamicItem[discord.ui.Select], template=r"list:status:(?P<owner>-?\d+)"):
+    def __init__(self, owner_id, status="watching", counts=None):
+        counts = counts or {}
+        super().__init__(discord.ui.Select(
+            custom_id=f"list:status:{owner_id}", placeholder="Filter status",
+            options=[discord.SelectOption(label=f"{l} ({counts.get(v, 0)})", value=v, emoji=e, default=v == status)
+                     for l, v, e in LIST_STATUSES],
+        ))
+        self.owner_id = owner_id
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(int(match["owner"]))
+
+    async def callback(self, interaction):
+        await interaction.response.defer()
+        embed, view, _ = await list_message(self.owner_id, await display_name(interaction, self.owner_id),
+                                            self.item.values[0])
+        await interaction.edit_original_response(embed=embed, view=view)
+
+
+def seasonal_message(user_id, season, year, media, tracked_ids, page, preview):
+    pages = max(1, math.ceil(len(media) / ITEMS_PER_PAGE))
+    page = min(page, pages - 1)
+    rows = media[page * ITEMS_PER_PAGE : (page + 1) * ITEMS_PER_PAGE]
+    preview = min(preview, len(rows) - 1)
+    if preview >= 0:
+        a = rows[preview]
         embed = discord.Embed(
             title=f"📡 {a['title']['romaji']}",
-            description=(a.get("description") or "No description.")[:1000],
+            description=clean_description(a.get("description")) or "No description.",
             color=0x5865F2,
         )
         if a.get("genres"):
             embed.add_field(name="Genres", value=format_genres(a["genres"]), inline=False)
         if a.get("coverImage", {}).get("medium"):
             embed.set_image(url=a["coverImage"]["medium"])
-        embed.set_footer(text=f"Preview {self.preview_index + 1}/{len(page)} - Page {self.page + 1}/{self.max_pages()}")
-        return embed
-
-    def update_controls(self):
-        if self.preview_mode:
-            self.prev.disabled = self.preview_index == 0
-            self.next.disabled = self.preview_index >= len(self.page_slice()) - 1
-        else:
-            self.prev.disabled = self.page == 0
-            self.next.disabled = self.page >= self.max_pages() - 1
-        self.zoom.label = "↩️" if self.preview_mode else "🔍"
-
-    @discord.ui.select(
-        placeholder="Change season",
-        options=[discord.SelectOption(label=s.title(), value=s) for s in SEASONS],
-    )
-    async def season_select(self, interaction: discord.Interaction, select: discord.ui.Select):
-        self.season = select.values[0]
-        self.page = 0
-        self.preview_mode = False
-        self.data = await get_seasonal_anime(self.season, self.year)
-        self.update_controls()
-        await interaction.response.edit_message(embed=self.build_list_embed(), view=self)
-
-    @discord.ui.button(label="◀", style=discord.ButtonStyle.gray)
-    async def prev(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if self.preview_mode: self.preview_index -= 1
-        else: self.page -= 1
-        self.update_controls()
-        embed = self.build_preview_embed() if self.preview_mode else self.build_list_embed()
-        await interaction.response.edit_message(embed=embed, view=self)
-
-    @discord.ui.button(label="▶", style=discord.ButtonStyle.gray)
-    async def next(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if self.preview_mode: self.preview_index += 1
-        else: self.page += 1
-        self.update_controls()
-        embed = self.build_preview_embed() if self.preview_mode else self.build_list_embed()
-        await interaction.response.edit_message(embed=embed, view=self)
-
-    @discord.ui.button(label="🔍", style=discord.ButtonStyle.blurple)
-    async def zoom(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if not self.page_slice(): return
-        self.preview_mode = not self.preview_mode
-        self.preview_index = 0
-        self.update_controls()
-        embed = self.build_preview_embed() if self.preview_mode else self.build_list_embed()
-        await interaction.response.edit_message(embed=embed, view=self)
+        embed.set_footer(text=f"Preview {preview + 1}/{len(rows)} - Page {page + 1}/{pages}")
+    else:
+        lines = [f"{'✅ ' if a['id'] in tracked_ids else ''}**{a['title']['romaji']}** — {a.get('episodes') or '?'} eps"
+                 for a in rows]
+        embed = discord.Embed(
+            title=f"📡 {season.title()} {year} Seasonal",
+            description="\n".join(lines) if lines else "No anime found.",
+            color=0xF39C12,
+        )
+        embed.set_footer(text=f"Page {page + 1}/{pages}")
+    buttons = pager_buttons(SeasonalButton, (user_id, season, year), page, pages, preview, len(rows))
+    return embed, pager_view(SeasonSelect(user_id, year, season), buttons)
+
+
+# Streams the season into the message as AniList pages arrive, then warms the other seasons
+async def load_seasonal(user_id, season, year, show):
+    tracked_ids, shown = await get_tracked_ids(user_id), None
+    async def on_page(media):
+        nonlocal shown
+        shown = media
+        try: await show(*seasonal_message(user_id, season, year, media, tracked_ids, 0, -1))
+        except discord.HTTPException: pass
+    data = await cached_seasonal(season, year, on_page)
+    if data is not shown:
+        await show(*seasonal_message(user_id, season, year, data, tracked_ids, 0, -1))
+    prefetch_seasons([s for s in SEASONS if s != season], year)
+
+
+class SeasonalButton(discord.ui.DynamicItem[discord.ui.Button],
+                     template=r"seasonal:(?P<action>prev|next|zoom):(?P<user>-?\d+):(?P<season>[A-Z]+):(?P<year>\d+):(?P<page>\d+):(?P<preview>-?\d+)"):
+    def __init__(self, action, user_id, season, year, page, preview, **button):
+        super().__init__(discord.ui.Button(custom_id=f"seasonal:{action}:{user_id}:{season}:{year}:{page}:{preview}", **button))
+        self.action, self.user_id, self.season, self.year, self.page, self.preview = action, user_id, season, year, page, preview
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(match["action"], int(match["user"]), match["season"], int(match["year"]),
+                   int(match["page"]), int(match["preview"]))
+
+    async def callback(self, interaction):
+        await interaction.response.defer()
+        media = await cached_seasonal(self.season, self.year)
+        embed, view = seasonal_message(self.user_id, self.season, self.year, media, await get_tracked_ids(self.user_id),
+                                       *step(self.action, self.page, self.preview))
+        await interaction.edit_original_response(embed=embed, view=view)
+
+
+# message id -> the season load that may still edit it, so an older, slower load
+# can't overwrite a newer pick; entries only live while a season streams in
+_season_loads = {}
+
+
+class SeasonSelect(discord.ui.DynamicItem[discord.ui.Select], template=r"seasonal:season:(?P<user>-?\d+):(?P<year>\d+)"):
+    def __init__(self, user_id, year, season=None):
+        super().__init__(discord.ui.Select(
+            custom_id=f"seasonal:season:{user_id}:{year}", placeholder="Change season",
+            options=[discord.SelectOption(label=s.title(), value=s, default=s == season) for s in SEASONS],
+        ))
+        self.user_id, self.year = user_id, year
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(int(match["user"]), int(match["year"]))
+
+    async def callback(self, interaction):
+        await interaction.response.defer()
+        message_id, token = interaction.message.id, object()
+        _season_loads[message_id] = token
+        async def show(embed, view):
+            if _season_loads.get(message_id) is token:
+                await interaction.edit_original_response(embed=embed, view=view)
+        try: await load_seasonal(self.user_id, self.item.values[0], self.year, show)
+        finally:
+            if _season_loads.get(message_id) is token: del _season_loads[message_id]
 
 # ---------------- COMMANDS ----------------
 
 @bot.tree.command(name="list", description="View a user's tracked anime")
 async def list_cmd(interaction: discord.Interaction, user: discord.User = None):
-    await interaction.response.defer() 
+    await defer(interaction)
     target = user or interaction.user
-    rows = await list_tracked(target.id)
-    if not rows:
+    embed, view, counts = await list_message(target.id, target.display_name, "watching")
+    if not any(counts.values()):
         return await interaction.followup.send("No tracked anime.")
-    view = ListView(target, rows)
-    await interaction.followup.send(embed=view.build_list_embed(), view=view)
+    await interaction.followup.send(embed=embed, view=view)
 
 
 @bot.tree.command(name="progress", description="Check detailed progress for an anime")
 async def progress(interaction: discord.Interaction, identifier:str):
-    await interaction.response.defer()
+    await defer(interaction)
     if not (prog:=await get_progress(interaction.user.id,identifier)):
         return await interaction.followup.send(f"❌ Not tracking '{identifier}'.",ephemeral=True)
     name,alias,last_watched,anime_id,status=prog
@@ -318,14 +414,14 @@ async def progress(interaction: discord.Interaction, identifier:str):
         return await interaction.followup.send("❌ AniList error.",ephemeral=True)
     embed=discord.Embed(
         title=f"📺 {name} ({alias})",
-        description=(data.get("description") or "No description.")[:1000],
+        description=clean_description(data.get("description")) or "No description.",
         color=0x3498db
     )
     embed.add_field(name="Progress",value=f"**Status:** {status.title()}\n**Watched:** Ep {last_watched}",inline=False)
     if eps:=data.get("episodes"): embed.add_field(name="Total",value=str(eps),inline=True)
     if genres:=format_genres(data.get("genres",[])): embed.add_field(name="Genres",value=genres,inline=True)
     if next_ep:=data.get("nextAiringEpisode"):
-        ts=datetime.fromtimestamp(next_ep["airingAt"],tz=timezone.utc).astimezone(ZoneInfo(TIMEZONE))
+        ts=datetime.fromtimestamp(next_ep["airingAt"],tz=timezone.utc).astimezone(await guild_timezone(interaction.guild_id))
         embed.add_field(name="Next Episode",value=f"Ep {next_ep['episode']} — {ts.strftime('%Y-%m-%d %H:%M')}",inline=False)
     if thumb:=data.get("coverImage",{}).get("large"): embed.set_thumbnail(url=thumb)
     await interaction.followup.send(embed=embed)
@@ -333,12 +429,14 @@ async def progress(interaction: discord.Interaction, identifier:str):
 
 @bot.tree.command(name="track", description="Start tracking a new anime")
 async def track(interaction: discord.Interaction, anime:str, alias:str=None, episode:int=0):
-    await interaction.response.defer()
-    if not (data:=await search_anime(anime)):
+    await defer(interaction)
+    if not (data:=await resolve_anime(anime)):
         return await interaction.followup.send("❌ Anime not found.",ephemeral=True)
     title=data["title"]["romaji"]
-    final_alias=alias or "".join(w[0] for w in title.split() if w).upper()
-    await add_anime(interaction.user.id,data["id"],title,final_alias,episode,"watching")
+    final_alias=alias or default_alias(title,set(await get_aliases(interaction.user.id)))
+    try: await add_anime(interaction.user.id,data["id"],title,final_alias,episode,"watching")
+    except ValueError as e: return await interaction.followup.send(f"❌ {e}",ephemeral=True)
+    replan_soon(data["id"])
     embed=discord.Embed(title=f"✅ Tracking {title}",color=0x1abc9c)
     embed.add_field(name="Alias",value=f"`{final_alias}`",inline=True)
     if thumb:=data.get("coverImage",{}).get("large"): embed.set_thumbnail(url=thumb)
@@ -349,8 +447,9 @@ async def track(interaction: discord.Interaction, anime:str, alias:str=None, epi
 async def watched(interaction: discord.Interaction, identifier: str, episode: int | None = None):
     prog = await get_progress(interaction.user.id, identifier)
     if not prog: return await interaction.response.send_message("❌ Not tracking this anime.", ephemeral=True)
-    name, _, last, anime_id, _ = prog
+    name, _, last, anime_id, old_status = prog
     await update_progress(interaction.user.id, anime_id, (new_ep := episode or last + 1))
+    if old_status == "watched": replan_soon(anime_id)  # back to watching, so alerting again
     await (interaction.followup.send if interaction.response.is_done() else interaction.response.send_message)(f"✅ `{name}` → Episode {new_ep}.")
 STATUS_CHOICES = [
     app_commands.Choice(name="Watching", value="watching"),
@@ -363,17 +462,18 @@ STATUS_CHOICES = [
 @app_commands.choices(status=STATUS_CHOICES)
 async def mark(interaction: discord.Interaction, identifier: str, status: str):
     # Defer the response
-    await interaction.response.defer(ephemeral=True)
+    await defer(interaction, ephemeral=True)
 
     # Get anime progress
     prog = await get_progress(interaction.user.id, identifier)
     if not prog:
         return await interaction.followup.send("❌ Not tracking this anime.")
 
-    name, _, _, anime_id, _ = prog
+    name, _, _, anime_id, old_status = prog
 
-    # Update status
+    # Update status; only a move in or out of "watched" changes who gets alerts
     await update_status(interaction.user.id, anime_id, status)
+    if (old_status == "watched") != (status == "watched"): replan_soon(anime_id)
 
     # Send confirmation
     await interaction.followup.send(f"✅ `{name}` marked as **{status.replace('_',' ').title()}**.")
@@ -382,64 +482,270 @@ async def mark(interaction: discord.Interaction, identifier: str, status: str):
 async def untrack(interaction: discord.Interaction, identifier: str):
     if not (prog := await get_progress(interaction.user.id, identifier)):
         return await interaction.response.send_message("❌ Not tracking this anime.", ephemeral=True)
-    name, _, _, anime_id, _ = prog
+    name, _, _, anime_id, old_status = prog
     await remove_anime(interaction.user.id, anime_id)
+    if old_status != "watched": replan_soon(anime_id)
     await interaction.response.send_message(f"🗑️ Stopped tracking `{name}`.")
 
 @bot.tree.command(name="seasonal", description="Browse seasonal anime")
 async def seasonal(interaction: discord.Interaction, year: int = None):
-    await interaction.response.defer()
-    season, d_year = current_season_year()
-    data = await get_seasonal_anime(season, year or d_year)
-    all_tracked = await get_all_tracked()
-    tracked_ids = {anime_id for uid, anime_id, _, _ in all_tracked if uid == interaction.user.id}
-    view = SeasonalView(interaction.user.id, season, year or d_year, data, tracked_ids)
-    await interaction.followup.send(embed=view.build_list_embed(), view=view)
+    await defer(interaction)
+    season, d_year = current_season_year(await guild_timezone(interaction.guild_id))
+    message = None
+    async def show(embed, view):
+        nonlocal message
+        if message: await message.edit(embed=embed, view=view)
+        else: message = await interaction.followup.send(embed=embed, view=view)
+    await load_seasonal(interaction.user.id, season, year or d_year, show)
 
 
 @bot.tree.command(name="alias", description="Change the alias for a tracked anime")
 async def change_alias(interaction: discord.Interaction, identifier:str, new_alias:str):
     if not (prog:=await get_progress(interaction.user.id,identifier)):
         return await interaction.response.send_message("❌ Not tracking.",ephemeral=True)
-    await update_alias(interaction.user.id,prog[3],new_alias)
+    try: await update_alias(interaction.user.id,prog[3],new_alias)
+    except ValueError as e: return await interaction.response.send_message(f"❌ {e}",ephemeral=True)
     await interaction.response.send_message(f"✏️ **{prog[0]}** alias: `{prog[1]}` → `{new_alias}`")
 
+# ---------------- IMPORT ----------------
+MAX_IMPORT_BYTES=20*1024*1024
+
+# Edits the deferred reply with the import's progress, at most once a second
+def import_reporter(interaction):
+    last=0.0
+    async def report(text):
+        nonlocal last
+        if time.monotonic()-last>=1:
+            last=time.monotonic()
+            await interaction.edit_original_response(content=text)
+    return report
+
+# entries: (media, episodes watched, status); one bulk write, then the new
+# anime are scheduled in one batched fetch. Returns (added, updated) anime ids.
+async def run_import(user_id, entries, report):
+    title_index.add_media(m for m,_,_ in entries)
+    taken=set(await get_aliases(user_id)); rows={}
+    for media,watched,status in entries:
+        title=media["title"]["romaji"]
+        rows[media["id"]]=(media["id"],title,(alias:=default_alias(title,taken)),watched,status)
+        taken.add(alias)
+    await report(f"💾 Saving {len(rows)} anime…")
+    added,updated=await import_tracked(user_id,list(rows.values()))
+    replan_many_soon([i for i in added if rows[i][4]!="watched"])
+    return added,updated
+
+@bot.tree.command(name="import", description="Import your AniList or MyAnimeList watchlist")
+@app_commands.describe(anilist_user="AniList username to import from", mal_export="MyAnimeList list export (.xml or .xml.gz)")
+async def import_cmd(interaction: discord.Interaction, anilist_user: str = None, mal_export: discord.Attachment = None):
+    if bool(anilist_user)==bool(mal_export):
+        return await interaction.response.send_message("❌ Give either an AniList username or a MyAnimeList export.",ephemeral=True)
+    if mal_export and mal_export.size>MAX_IMPORT_BYTES:
+        return await interaction.response.send_message("❌ That file is too large.",ephemeral=True)
+    await defer(interaction,ephemeral=True)
+    report=import_reporter(interaction)
+    try:
+        if anilist_user: entries,skipped=await anilist_entries(anilist_user,report)
+        else: entries,skipped=await mal_entries(attachment_chunks(mal_export),report,ANILIST_CONCURRENCY)
+        added,updated=await run_import(interaction.user.id,entries,report)
+    except ValueError as e:
+        return await interaction.edit_original_response(content=f"❌ {e}")
+    note=f" Skipped {skipped} dropped or unmatched." if skipped else ""
+    await interaction.edit_original_response(content=f"✅ Imported {len(added)} new anime, moved progress forward on {len(updated)}.{note}")
+
+@bot.tree.command(name="config", description="Set where episode alerts go in this server")
+@app_commands.guild_only()
+@app_commands.default_permissions(manage_guild=True)
+@app_commands.rename(tz="timezone")
+@app_commands.describe(channel="Channel for episode alerts", role="Only alert members with this role",
+                       tz="IANA timezone, e.g. Europe/London", reset="Clear all settings first")
+async def config_cmd(interaction: discord.Interaction, channel: discord.TextChannel = None,
+                     role: discord.Role = None, tz: str = None, reset: bool = False):
+    if tz:
+        try: ZoneInfo(tz)
+        except (ZoneInfoNotFoundError, ValueError):
+            return await interaction.response.send_message(f"❌ Unknown timezone '{tz}'.", ephemeral=True)
+    changes = dict.fromkeys(GUILD_CONFIG_FIELDS) if reset else {}
+    if channel: changes["alert_channel_id"] = channel.id
+    if role: changes["alert_role_id"] = role.id
+    if tz: changes["timezone"] = tz
+    cfg = await set_guild_config(interaction.guild_id, **changes) if changes else await get_guild_config(interaction.guild_id)
+    embed = discord.Embed(title="⚙️ Alert settings", color=0x95a5a6)
+    embed.add_field(name="Channel", value=f"<#{cfg['alert_channel_id']}>" if cfg["alert_channel_id"] else "First writable channel")
+    role_id = cfg["alert_role_id"] or (ALERT_ROLE_ID if interaction.guild_id == GUILD_ID else None)
+    embed.add_field(name="Role", value=f"<@&{role_id}>" if role_id else "Everyone")
+    embed.add_field(name="Timezone", value=cfg["timezone"] or TIMEZONE)
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
 # ---------------- AUTOCOMPLETE ----------------
 async def alias_autocomplete(interaction: discord.Interaction, current: str):
-    aliases = await get_aliases(interaction.user.id)
+    matches = await search_aliases(interaction.user.id, current)
+    return [
+        app_commands.Choice(name=(a if a == t else f"{a} — {t}")[:100], value=a)
+        for a, t in matches
+    ]
+
+# Suggests titles from the local index; a pick submits "#<anime_id>"
+async def anime_autocomplete(interaction: discord.Interaction, current: str):
     return [
-        app_commands.Choice(name=a, value=a)
-        for a in aliases
-        if current.lower() in a.lower()
-    ][:25]
+        app_commands.Choice(name=(t if t == v else f"{t} ({v})")[:100], value=f"#{anime_id}")
+        for anime_id, t, v, _ in title_index.search(current)
+    ]
+
+# Free text only goes to AniList when no indexed title is close enough
+async def resolve_anime(anime):
+    if anime.startswith("#") and anime[1:].isdigit():
+        return await cached_search_id(int(anime[1:]))
+    if (anime_id:=title_index.resolve(anime)) and (data:=await cached_search_id(anime_id)):
+        return data
+    return await cached_search(anime)
 
 # ---------------- BACKGROUND TASK ----------------
-@tasks.loop(minutes=10)
-async def check_new_episodes():
-    try:
-        now=datetime.now(timezone.utc)
-        if not (guild:=bot.get_guild(GUILD_ID)): return
-        channel=next((c for c in guild.text_channels if c.permissions_for(guild.me).send_messages),None)
-
-        for user_id,anime_id,_,last_notified in await get_all_tracked():
-            if not (data:=await cached_search_id(anime_id)): continue
-            if not (ep:=data.get("nextAiringEpisode")): continue
-            if ep["episode"] <= (last_notified or 0): continue
-
-            airing=datetime.fromtimestamp(ep["airingAt"],tz=timezone.utc)
-            if now+timedelta(minutes=30) < airing: continue
-            if not (member:=guild.get_member(user_id)): continue
-            if ALERT_ROLE_ID and (not (role:=guild.get_role(ALERT_ROLE_ID)) or role not in member.roles): continue
-
-            title=data["title"]["romaji"]
-            msg=f"{member.mention} 🎉 **{title}** Ep **{ep['episode']}** is out!"
-            if channel: await channel.send(msg)
-            try: await member.send(f"🎉 {title} Ep {ep['episode']} is out!")
+# Splits mentions so each channel message stays under Discord's 2000 character limit
+def mention_chunks(members,suffix,limit=2000):
+    chunk=[]
+    for m in members:
+        if chunk and len(" ".join(chunk+[m.mention]))+len(suffix)+1>limit:
+            yield " ".join(chunk); chunk=[]
+        chunk.append(m.mention)
+    if chunk: yield " ".join(chunk)
+
+async def notify_episode(data,episode):
+    with NOTIFIER_SWEEP_SECONDS.labels("episode").time(): await _notify_episode(data,episode)
+
+# Guilds on this process's shards
+def notifier_guilds(): return bot.guilds
+
+# Configured alert channel (else the first writable one) and alert role of a guild
+async def alert_target(guild):
+    config=await get_guild_config(guild.id)
+    channel=guild.get_channel(config["alert_channel_id"]) if config["alert_channel_id"] else None
+    if not channel: channel=next((c for c in guild.text_channels if c.permissions_for(guild.me).send_messages),None)
+    role_id=config["alert_role_id"] or (ALERT_ROLE_ID if guild.id==GUILD_ID else None)
+    return channel,role_id
+
+async def _notify_episode(data,episode):
+    anime_id,title=data["id"],data["title"]["romaji"]
+    trackers=await get_trackers(anime_id)
+    NOTIFIER_ROWS_SCANNED.inc(len(trackers))
+    due=[user_id for user_id,last_notified in trackers if episode>(last_notified or 0)]
+    if not due: return
+
+    # (channel, members) per guild, grouped by shard; members are resolved only for due users
+    sem=asyncio.Semaphore(NOTIFY_CONCURRENCY)
+    async def target(guild):
+        async with sem:
+            channel,role_id=await alert_target(guild)
+            role=guild.get_role(role_id) if role_id else None
+            found=await member_resolver.resolve(guild,due)
+            return guild,channel,[m for u in due if (m:=found.get(u)) and (not role_id or (role and role in m.roles))]
+    shards=defaultdict(list)
+    users={}
+    for guild,channel,members in await asyncio.gather(*(target(g) for g in notifier_guilds())):
+        if not members: continue
+        shards[guild.shard_id].append((channel,members))
+        users.update((m.id,m) for m in members)
+    if not users: return
+
+    # Claim before sending: another replica or a retry that got here first keeps its users
+    claimed=set(await claim_notifications(anime_id,episode,list(users)))
+    if not claimed: return
+
+    # One channel message per guild and episode, shards in parallel, one DM per user
+    suffix=f"🎉 **{title}** Ep **{episode}** is out!"
+    async def announce(targets):
+        for channel,members in targets:
+            if not channel or not (members:=[m for m in members if m.id in claimed]): continue
+            for mentions in mention_chunks(members,suffix):
+                try: await channel.send(f"{mentions} {suffix}")
+                except discord.HTTPException as e: print(f"Alert send failed in guild {channel.guild.id}: {e}"); break
+                NOTIFICATIONS_SENT.labels("channel").inc()
+
+    async def dm(member):
+        async with sem:
+            try:
+                await member.send(f"🎉 {title} Ep {episode} is out!")
+                NOTIFICATIONS_SENT.labels("dm").inc()
             except: pass
-            await update_last_notified(user_id,anime_id,ep["episode"])
+    await asyncio.gather(*(announce(t) for t in shards.values()), *(dm(users[u]) for u in claimed))
+
+airing_scheduler=AiringScheduler(fetch_airing,notify_episode)
+
+# ---------------- NOTIFIER PARTITIONS ----------------
+# Replicas split tracked anime into NOTIFIER_PARTITIONS buckets by anime_id and
+# each schedules only the buckets it holds; None until the first rebalance
+owned_partitions=None
+planned_ids=set()
+
+def owns(anime_id): return owned_partitions is not None and anime_id%NOTIFIER_PARTITIONS in owned_partitions
+
+# Re-plans only the anime whose tracked set changed; watched entries don't get alerts
+async def replan_tracked(anime_id):
+    if not owns(anime_id): return
+    if await get_trackers(anime_id): await airing_scheduler.replan(anime_id)
+    else: airing_scheduler.discard(anime_id)
+
+# Replans in the background: a replan may wait on AniList, and commands have
+# to answer within Discord's 3s window
+_replans=set()
+def _replan_in_background(replan,what):
+    async def run():
+        try: await replan
+        except Exception as e: print(f"Replan error for {what}: {e}")
+    task=asyncio.create_task(run()); _replans.add(task); task.add_done_callback(_replans.discard)
+
+def replan_soon(anime_id):
+    if owns(anime_id): _replan_in_background(replan_tracked(anime_id),anime_id)
+
+def replan_many_soon(anime_ids):
+    if anime_ids:=[i for i in anime_ids if owns(i)]: _replan_in_background(airing_scheduler.replan_many(anime_ids),f"{len(anime_ids)} anime")
+
+async def owned_tracked_ids():
+    return {i for i in await get_tracked_anime_ids() if owns(i)}
+
+async def sweep():
+    global planned_ids
+    with NOTIFIER_SWEEP_SECONDS.labels("plan").time():
+        planned_ids=await owned_tracked_ids()
+        await airing_scheduler.plan(planned_ids)
+    airing_scheduler.start()
+    mark_sweep()
+
+# Full resync of the airing plan; the scheduler sleeps until each episode airs in between
+@tasks.loop(hours=6)
+async def check_new_episodes():
+    if owned_partitions is None: return  # the first rebalance plans instead
+    try: await sweep()
     except Exception as e:
         print(f"Loop Error: {e}")
 
+@check_new_episodes.before_loop
+async def before_check_new_episodes():
+    await bot.wait_until_ready()
+
+# Takes over partitions of replicas that died and hands some back when one joins.
+# Also schedules anime newly tracked through another replica, and reloads the
+# tracker projection if its change feed dropped.
+@tasks.loop(seconds=REBALANCE_INTERVAL)
+async def rebalance_notifier():
+    global owned_partitions,planned_ids
+    try:
+        if await refresh_trackers(): print(f"✅ Reloaded {len(tracker_index)} notifier trackers.")
+        held=await rebalance_partitions(NOTIFIER_PARTITIONS,SHARD_GROUP)
+        if held!=owned_partitions:
+            owned_partitions=held
+            print(f"✅ Notifier holds {len(held)}/{NOTIFIER_PARTITIONS} partitions.")
+            return await sweep()
+        ids=await owned_tracked_ids()
+        await airing_scheduler.replan_many(ids-planned_ids)
+        for anime_id in planned_ids-ids: airing_scheduler.discard(anime_id)
+        planned_ids=ids
+    except Exception as e:
+        print(f"Rebalance Error: {e}")
+
+@rebalance_notifier.before_loop
+async def before_rebalance_notifier():
+    await bot.wait_until_ready()
+
 
-keep_alive()
-bot.run(TOKEN)
\ No newline at end of file
+if __name__ == "__main__":
+    bot.run(TOKEN)
\ No newline at end of file
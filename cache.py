@@ -0,0 +1,231 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from anilist import search_anime, search_anime_by_id, iter_seasonal_anime, covers, PROJECTIONS, INTERACTIVE, BACKGROUND
+from database import upsert_media, get_media, load_media, load_titles
+from metrics import watch_caches
+from title_index import title_index
+
+MEDIA_CACHE_SIZE = int(os.getenv("MEDIA_CACHE_SIZE") or 2000)
+CACHE_TTL = 600          # successful lookups
+NEGATIVE_CACHE_TTL = 30  # failed or empty lookups, so AniList errors heal quickly
+STALE_TIMEOUT = 2.0      # how long to wait on AniList before serving a stale copy
+
+_MISSING = object()
+
+
+# A fetch result with parts missing (a season with a failed page): served, but
+# cached only for negative_ttl, and never over a complete copy
+class Partial(list):
+    pass
+
+
+# ---------------- LRU + TTL CACHE ----------------
+# Bounded LRU with separate TTLs for hits and failures. Concurrent misses on the
+# same key share one in-flight fetch instead of each calling AniList. Expired
+# entries are kept until evicted and served when AniList is slow or down, and
+# fallback(keys) -> {key: value} is consulted when there is no copy in memory.
+# Lookups may pass accept(value) to skip entries that lack fields they need
+# (failures are served regardless); a new copy of the same media is merged
+# into the old one, so a lean refresh keeps the fields it didn't fetch.
+class MediaCache:
+    def __init__(self, maxsize, ttl=CACHE_TTL, negative_ttl=NEGATIVE_CACHE_TTL, fallback=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.fallback = fallback
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._inflight = {}            # (key, accept) -> task resolving to the value
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def set(self, key, value):
+        stale = self._stale(key)
+        if value and isinstance(stale, dict) and stale.get("id") == value.get("id"):
+            value = {**stale, **value}
+        if value and not isinstance(value, Partial):
+            self._store(key, value, time.time() + self.ttl)
+        elif stale is not _MISSING and not isinstance(stale, Partial):
+            # Keep serving the last good copy, but retry AniList soon
+            self._store(key, stale, time.time() + self.negative_ttl)
+        else:
+            self._store(key, value, time.time() + self.negative_ttl)
+
+    # Loads persisted (key, value, fetched_at) rows, newest first; old rows load already stale
+    def warm(self, items):
+        for key, value, fetched_at in items:
+            if key not in self._entries:
+                self._store(key, value, fetched_at + self.ttl)
+                self._entries.move_to_end(key, last=False)
+
+    def _store(self, key, value, expires_at):
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    # The stored value, expired or not
+    def peek(self, key):
+        entry = self._entries.get(key)
+        return entry[0] if entry else None
+
+    def _lookup(self, key, accept=None):
+        entry = self._entries.get(key)
+        if entry and entry[1] > time.time() and (not entry[0] or accept is None or accept(entry[0])):
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+        return _MISSING
+
+    def _stale(self, key, accept=None):
+        entry = self._entries.get(key)
+        return entry[0] if entry and entry[0] and (accept is None or accept(entry[0])) else _MISSING
+
+    async def _fall_back(self, keys):
+        if not self.fallback or not keys:
+            return {}
+        try:
+            found = await self.fallback(keys)
+        except Exception as e:
+            print("Cache fallback error:", e)
+            return {}
+        for key, value in found.items():
+            self._store(key, value, time.time() + self.negative_ttl)
+        return found
+
+    def _track(self, key, task, accept=None):
+        self._inflight[(key, accept)] = task
+
+        def done(t):
+            self._inflight.pop((key, accept), None)
+            if not t.cancelled() and t.exception() is None:
+                self.set(key, t.result())
+
+        task.add_done_callback(done)
+        return task
+
+    async def get_or_fetch(self, key, fetch, accept=None):
+        if (value := self._lookup(key, accept)) is not _MISSING:
+            return value
+        task = self._inflight.get((key, accept)) or self._track(key, asyncio.ensure_future(fetch()), accept)
+        # shield: a cancelled or timed-out caller must not cancel the shared fetch
+        if (stale := self._stale(key, accept)) is not _MISSING:
+            try:
+                return await asyncio.wait_for(asyncio.shield(task), STALE_TIMEOUT) or stale
+            except asyncio.TimeoutError:
+                return stale
+        if not (value := await asyncio.shield(task)):
+            value = (await self._fall_back([key])).get(key, value)
+        return value
+
+
+media_cache = MediaCache(MEDIA_CACHE_SIZE, fallback=get_media)
+search_cache = MediaCache(500)
+seasonal_cache = MediaCache(16, ttl=3600)
+watch_caches(media=media_cache, search=search_cache, seasonal=seasonal_cache)
+
+
+# ---------------- PERSISTENCE ----------------
+_background = set()
+
+# Caches freshly fetched media and writes it to anime_media off the request
+# path. Lean records are merged into the cached copy and only stored once the
+# result is a full card.
+def remember(media_list):
+    media_list = [m for m in media_list if m]
+    title_index.add_media(media_list)
+    for m in media_list:
+        media_cache.set(m["id"], m)
+    if full := [m for m in map(media_cache.peek, (m["id"] for m in media_list)) if covers(m, "card")]:
+        task = asyncio.create_task(_persist(full))
+        _background.add(task)
+        task.add_done_callback(_background.discard)
+
+
+async def _persist(media_list):
+    try:
+        await upsert_media(media_list)
+    except Exception as e:
+        print("Media persist error:", e)
+
+
+async def warm_media_cache():
+    rows = await load_media(MEDIA_CACHE_SIZE)
+    media_cache.warm((m["id"], m, fetched_at) for m, fetched_at in rows)
+    return len(rows)
+
+
+async def warm_title_index():
+    for anime_id, title, english, synonyms in await load_titles():
+        title_index.add(anime_id, [t for t in (title, english, *(synonyms or ())) if t])
+    return len(title_index)
+
+
+# ---------------- CACHED ANILIST LOOKUPS ----------------
+# projection names an anilist.PROJECTIONS entry; cached records fetched with a
+# wider one are served as they are
+_accepts = {p: (lambda m, p=p: covers(m, p)) for p in PROJECTIONS}
+
+
+async def _search(search):
+    data = await search_anime(search)
+    remember([data])
+    return data
+
+
+async def _fetch_id(anime_id, projection):
+    data = await search_anime_by_id(anime_id, projection)
+    remember([data])
+    return media_cache.peek(anime_id) if data else data
+
+
+async def cached_search(search):
+    return await search_cache.get_or_fetch(search.strip().lower(), lambda: _search(search))
+
+
+async def cached_search_id(anime_id, projection="card"):
+    return await media_cache.get_or_fetch(anime_id, lambda: _fetch_id(anime_id, projection), _accepts[projection])
+
+
+# on_page(media) is called with the contiguous pages fetched so far; only the
+# caller that starts the fetch sees them, later callers wait for the full season
+async def cached_seasonal(season: str, year: int, on_page=None, priority=INTERACTIVE):
+    return await seasonal_cache.get_or_fetch(
+        (season.upper(), year), lambda: _fetch_season(season, year, on_page, priority)
+    )
+
+
+async def _fetch_season(season, year, on_page, priority):
+    pages, media, shown, failed = {}, [], 0, False
+    async for page, page_media in iter_seasonal_anime(season, year, priority):
+        if page_media is None:
+            failed = True
+            continue
+        title_index.add_media(page_media)
+        pages[page] = page_media
+        if shown + 1 not in pages:
+            continue
+        while shown + 1 in pages:
+            shown += 1
+            media = media + pages[shown]
+        if on_page:
+            try:
+                await on_page(media)
+            except Exception as e:
+                print("Seasonal page callback error:", e)
+    return Partial(media) if failed else media
+
+
+def prefetch_seasons(seasons, year):
+    for season in seasons:
+        task = asyncio.create_task(cached_seasonal(season, year, priority=BACKGROUND))
+        _background.add(task)
+        task.add_done_callback(_background.discard)
@@ -1,136 +1,349 @@
 import os
-import asyncpg
+import time
+import asyncio
+import functools
+from alias_index import alias_index
+from tracker_index import tracker_index
+from write_behind import write_behind
+from metrics import DB_QUERY_SECONDS, watch_pool
+from storage import open_storage
+from storage.base import new_stat, observe, summary, media_to_row
 
+# postgres://... for a managed database, sqlite:///bot.db or sqlite://:memory:
+# for an embedded one (see storage/__init__.py)
 DATABASE_URL = os.getenv("DATABASE_URL")
-if not DATABASE_URL:
-    raise RuntimeError("DATABASE_URL is not set")
+# Optional write-behind for /watched and /mark (see WRITE-BEHIND below): at most
+# WRITE_BEHIND_MS of changes, and never more than WRITE_BEHIND_MAX rows, are
+# held in memory before they reach the database. 0 writes every change through.
+WRITE_BEHIND_MS = int(os.getenv("WRITE_BEHIND_MS") or 0)
+WRITE_BEHIND_MAX = int(os.getenv("WRITE_BEHIND_MAX") or 500)
 
-pool = None
+backend = None
+_flusher = None
 async def init_db():
-    global pool 
-    if pool is None:
-        pool = await asyncpg.create_pool(
-            dsn=DATABASE_URL,
-            min_size=1,
-            max_size=4,
-            timeout=10, 
-            ssl="require",
-            statement_cache_size=0
-        )
-
-    # create table if not exists
-    async with pool.acquire() as conn:
-        await conn.execute("""
-            CREATE TABLE IF NOT EXISTS tracked_anime (
-                user_id BIGINT,
-                anime_id INTEGER,
-                anime_name TEXT,
-                alias TEXT,
-                last_watched INTEGER DEFAULT 0,
-                last_notified INTEGER DEFAULT 0,
-                status TEXT DEFAULT 'watching',
-                PRIMARY KEY (user_id, anime_id)
-            )
-        """)
-
-
-# ---------------- CONNECTION HELPER ----------------
-async def get_conn():
-    if pool is None:
-        raise RuntimeError("DB pool not initialized. Call init_db() first.")
-    return pool
+    global backend, _flusher
+    if not DATABASE_URL:
+        raise RuntimeError("DATABASE_URL is not set")
+    if backend is None:
+        backend = open_storage(DATABASE_URL)
+    await backend.connect()
+    if WRITE_BEHIND_MS and _flusher is None:
+        _flusher = asyncio.create_task(_flush_loop())
+
+
+async def close_db():
+    global backend, _flusher
+    if _flusher is not None:
+        _flusher.cancel()
+        _flusher = None
+    if backend is not None:
+        try:
+            await flush_writes()
+        except Exception as e:
+            print(f"⚠️ Lost {len(write_behind)} unflushed progress updates: {e}")
+        await backend.close()
+        backend = None
+
+
+# ---------------- INSTRUMENTATION ----------------
+# [count, total seconds, max seconds] per function; connection waits are
+# counted by the backend
+_query_stats = {}
+
+
+def _timed(fn):
+    stat = _query_stats.setdefault(fn.__name__, new_stat())
+    histogram = DB_QUERY_SECONDS.labels(fn.__name__)
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            observe(stat, elapsed)
+            histogram.observe(elapsed)
+    return wrapper
+
+
+def pool_stats():
+    stats = backend.stats() if backend else {"backend": None, "waiting": 0, "acquire": summary(new_stat())}
+    return {**stats, "queries": {name: summary(stat) for name, stat in _query_stats.items()}}
+
+
+# Pool size, in-use and waiting connections for /metrics and /healthz
+watch_pool(lambda: backend.stats() if backend else {})
 
 
 # ---------------- ADD ----------------
+@_timed
 async def add_anime(user_id, anime_id, anime_name, alias, episode=0, status="watching"):
-    async with pool.acquire() as conn:
-        await conn.execute("""
-            INSERT INTO tracked_anime
-            (user_id, anime_id, anime_name, alias, last_watched, last_notified, status)
-            VALUES ($1, $2, $3, $4, $5, $5, $6)
-            ON CONFLICT (user_id, anime_id) DO NOTHING
-        """, user_id, anime_id, anime_name, alias, episode, status)
+    if await backend.add_anime(user_id, anime_id, anime_name, alias, episode, status):
+        alias_index.put(user_id, anime_id, alias, anime_name)
+        write_behind.put(user_id, anime_id, anime_name, alias, episode, status)
+        tracker_index.apply(anime_id, user_id, episode, status != "watched")
+
+
+# Bulk-loads (anime_id, anime_name, alias, last_watched, status) rows for one
+# user; already tracked anime only move their progress forward. Returns the
+# anime ids that were (added, updated).
+@_timed
+async def import_tracked(user_id, rows):
+    if write_behind.has_pending(user_id):
+        await flush_writes()
+    changed = await backend.import_tracked(user_id, rows) if rows else []
+    write_behind.forget(user_id)
+    added, updated = [], []
+    for anime_id, alias, anime_name, last_notified, status, inserted in changed:
+        if inserted:
+            alias_index.put(user_id, anime_id, alias, anime_name)
+        (added if inserted else updated).append(anime_id)
+        tracker_index.apply(anime_id, user_id, last_notified, status != "watched")
+    return added, updated
 
 
 # ---------------- UPDATE ----------------
+@_timed
 async def update_progress(user_id, anime_id, episode):
-    async with pool.acquire() as conn:
-        await conn.execute("""
-            UPDATE tracked_anime
-            SET last_watched = $1, status = 'watching'
-            WHERE user_id = $2 AND anime_id = $3
-        """, episode, user_id, anime_id)
+    if WRITE_BEHIND_MS:
+        last_notified = await _write_behind(user_id, anime_id, last_watched=episode, status="watching")
+    else:
+        last_notified = await backend.update_progress(user_id, anime_id, episode)
+    if last_notified is not None:
+        tracker_index.apply(anime_id, user_id, last_notified, True)
 
 
+@_timed
 async def update_status(user_id, anime_id, status):
-    async with pool.acquire() as conn:
-        await conn.execute("""
-            UPDATE tracked_anime
-            SET status = $1
-            WHERE user_id = $2 AND anime_id = $3
-        """, status, user_id, anime_id)
+    if WRITE_BEHIND_MS:
+        last_notified = await _write_behind(user_id, anime_id, status=status)
+    else:
+        last_notified = await backend.update_status(user_id, anime_id, status)
+    if last_notified is not None:
+        tracker_index.apply(anime_id, user_id, last_notified, status != "watched")
 
 
-async def update_last_notified(user_id, anime_id, episode):
-    async with pool.acquire() as conn:
-        await conn.execute("""
-            UPDATE tracked_anime
-            SET last_notified = $1
-            WHERE user_id = $2 AND anime_id = $3
-        """, episode, user_id, anime_id)
+# Atomically moves last_notified up to episode and returns the user ids that
+# were behind; only those get notified, so racing notifiers never double-send
+@_timed
+async def claim_notifications(anime_id, episode, user_ids):
+    claimed = await backend.claim_notifications(anime_id, episode, user_ids) if user_ids else []
+    tracker_index.advance(anime_id, claimed, episode)
+    return claimed
 
 
+@_timed
 async def update_alias(user_id, anime_id, new_alias):
-    async with pool.acquire() as conn:
-        await conn.execute("""
-            UPDATE tracked_anime
-            SET alias = $1
-            WHERE user_id = $2 AND anime_id = $3
-        """, new_alias, user_id, anime_id)
+    await backend.update_alias(user_id, anime_id, new_alias)
+    alias_index.set_alias(user_id, anime_id, new_alias)
+    write_behind.set_alias(user_id, anime_id, new_alias)
 
 
 # ---------------- GET ----------------
+@_timed
 async def get_progress(user_id, identifier):
-    async with pool.acquire() as conn:
-        row = await conn.fetchrow("""
-            SELECT anime_name, alias, last_watched, anime_id, status
-            FROM tracked_anime
-            WHERE user_id = $1
-              AND (alias = $2 OR anime_name = $2)
-        """, user_id, identifier)
-        return row
-
-
-async def list_tracked(user_id):
-    async with pool.acquire() as conn:
-        rows = await conn.fetch("""
-            SELECT anime_name, alias, last_watched, status
-            FROM tracked_anime
-            WHERE user_id = $1
-            ORDER BY anime_name
-        """, user_id)
-        return rows
+    if WRITE_BEHIND_MS:
+        await _load_progress(user_id)
+        return write_behind.get(user_id, identifier)
+    return await backend.get_progress(user_id, identifier)
+
+
+# One page of (anime_name, alias, last_watched, anime_id) rows with the given
+# status plus {status: count} for the user; cursor is None for the first page or
+# ("after" | "before" | "from", anime_id) relative to a row of the current page
+@_timed
+async def list_tracked_page(user_id, status, limit, cursor=None):
+    if write_behind.has_pending(user_id):
+        await flush_writes()
+    return await backend.list_page(user_id, status, limit, cursor)
 
 
+# Loads the user's aliases and titles into the in-process index on first use
+async def _load_alias_index(user_id):
+    while not alias_index.loaded(user_id):
+        token = alias_index.begin_load(user_id)
+        rows = await backend.alias_rows(user_id)
+        alias_index.finish_load(user_id, rows, token)
+
+
+@_timed
 async def get_aliases(user_id):
-    async with pool.acquire() as conn:
-        rows = await conn.fetch("SELECT alias FROM tracked_anime WHERE user_id = $1", user_id)
-        return [r["alias"] for r in rows]
+    await _load_alias_index(user_id)
+    return alias_index.aliases(user_id)
+
+
+# Autocomplete lookup over aliases and titles, as (alias, title) pairs
+@_timed
+async def search_aliases(user_id, current, limit=25):
+    await _load_alias_index(user_id)
+    return alias_index.search(user_id, current, limit)
+
+
+@_timed
+async def get_tracked_ids(user_id):
+    await _load_alias_index(user_id)
+    return alias_index.anime_ids(user_id)
+
+
+# The two notifier lookups read tracker_index while its change feed is up
+@_timed
+async def get_tracked_anime_ids():
+    return tracker_index.anime_ids() if tracker_index.ready else await backend.get_tracked_anime_ids()
+
+
+# (user_id, last_notified) of everyone who gets alerts for anime_id
+@_timed
+async def get_trackers(anime_id):
+    return tracker_index.trackers(anime_id) if tracker_index.ready else await backend.get_trackers(anime_id)
+
+
+# ---------------- ANILIST MEDIA ----------------
+@_timed
+async def upsert_media(media_list):
+    rows = [media_to_row(m) for m in media_list]
+    if rows:
+        await backend.upsert_media(rows)
+
+
+@_timed
+async def get_media(anime_ids):
+    return await backend.get_media(anime_ids)
+
+
+# Most recently fetched first, as (media, fetched_at epoch seconds)
+@_timed
+async def load_media(limit):
+    return await backend.load_media(limit)
+
+
+# (anime_id, title, title_english, synonyms) for the title index
+@_timed
+async def load_titles():
+    return await backend.title_rows()
+
+
+# ---------------- GUILD CONFIG ----------------
+# Tiny and read on every notification, so kept in memory and reloaded every
+# GUILD_CONFIG_TTL seconds to pick up changes made by other replicas
+GUILD_CONFIG_TTL = 60
+GUILD_CONFIG_FIELDS = ("alert_channel_id", "alert_role_id", "timezone")
+_guild_configs = {}
+_guild_configs_at = 0.0
+
+
+async def _guild_config_cache():
+    global _guild_configs, _guild_configs_at
+    if time.monotonic() - _guild_configs_at > GUILD_CONFIG_TTL:
+        rows = await backend.get_guild_configs()
+        _guild_configs = {r["guild_id"]: {f: r[f] for f in GUILD_CONFIG_FIELDS} for r in rows}
+        _guild_configs_at = time.monotonic()
+    return _guild_configs
+
+
+# {"alert_channel_id", "alert_role_id", "timezone"}, None where unset
+@_timed
+async def get_guild_config(guild_id):
+    return (await _guild_config_cache()).get(guild_id) or dict.fromkeys(GUILD_CONFIG_FIELDS)
+
+
+@_timed
+async def set_guild_config(guild_id, **changes):
+    config = {**await get_guild_config(guild_id), **changes}
+    await backend.set_guild_config(guild_id, *(config[f] for f in GUILD_CONFIG_FIELDS))
+    _guild_configs[guild_id] = config
+    return config
+
+
+# ---------------- BOT META ----------------
+@_timed
+async def get_meta(key):
+    return await backend.get_meta(key)
+
+
+@_timed
+async def set_meta(key, value):
+    await backend.set_meta(key, value)
+
+
+# ---------------- NOTIFIER PROJECTION ----------------
+# Subscribes to the backend's change feed, then loads tracker_index; changes
+# made meanwhile are replayed on top of the snapshot. A no-op while the index is
+# current, so callers can retry it after the feed drops.
+async def refresh_trackers():
+    if tracker_index.ready:
+        return False
+    token = tracker_index.begin_load()
+    try:
+        await backend.listen_trackers(tracker_index.apply, tracker_index.invalidate)
+        rows = await backend.tracker_rows()
+    except Exception:
+        tracker_index.abort_load()
+        raise
+    return tracker_index.finish_load(rows, token)
+
+
+# ---------------- WRITE-BEHIND ----------------
+# With WRITE_BEHIND_MS set, a user's rows are read once into write_behind and
+# /watched and /mark only change them there; repeated clicks on one anime
+# collapse into a single row of the next batched UPDATE. Reads that go to the
+# table (list pages) flush first. Only for deployments where one process
+# serves each user's commands: other replicas don't see held changes.
+async def _load_progress(user_id):
+    while not write_behind.loaded(user_id):
+        token = write_behind.begin_load(user_id)
+        rows = await backend.progress_rows(user_id)
+        write_behind.finish_load(user_id, rows, token)
+
+
+# Returns last_notified like the backend's update calls, taking the notifier's
+# newer value if it has advanced since the row was loaded. A full queue is
+# flushed before the change is taken, so a failed flush leaves it unapplied.
+async def _write_behind(user_id, anime_id, **changes):
+    if len(write_behind) >= WRITE_BEHIND_MAX:
+        await flush_writes()
+    await _load_progress(user_id)
+    if (last_notified := write_behind.update(user_id, anime_id, **changes)) is None:
+        return None
+    return max(last_notified, tracker_index.notified(anime_id, user_id) or 0)
+
+
+_flush_lock = asyncio.Lock()
+
+
+# Writes every held change in one round trip; on failure they are held again
+@_timed
+async def flush_writes():
+    async with _flush_lock:
+        if not (rows := write_behind.drain()):
+            return 0
+        try:
+            await backend.apply_progress_many(rows)
+        except Exception:
+            write_behind.requeue(rows)
+            raise
+        return len(rows)
+
+
+async def _flush_loop():
+    while True:
+        await asyncio.sleep(WRITE_BEHIND_MS / 1000)
+        try:
+            await flush_writes()
+        except Exception as e:
+            print(f"⚠️ Progress flush failed, {len(write_behind)} updates held: {e}")
 
 
-async def get_all_tracked():
-    async with pool.acquire() as conn:
-        rows = await conn.fetch("""
-            SELECT user_id, anime_id, last_watched, last_notified
-            FROM tracked_anime
-        """)
-        return rows
+# ---------------- NOTIFIER PARTITIONS ----------------
+@_timed
+async def rebalance_partitions(count, group=0):
+    return await backend.rebalance_partitions(count, group)
 
 
 # ---------------- DELETE ----------------
+@_timed
 async def remove_anime(user_id, anime_id):
-    async with pool.acquire() as conn:
-        await conn.execute("""
-            DELETE FROM tracked_anime
-            WHERE user_id = $1 AND anime_id = $2
-        """, user_id, anime_id)
+    await backend.remove_anime(user_id, anime_id)
+    alias_index.remove(user_id, anime_id)
+    write_behind.remove(user_id, anime_id)
+    tracker_index.apply(anime_id, user_id, 0, False)
@@ -0,0 +1,103 @@
+import aiohttp
+import asyncio
+import zlib
+import xml.etree.ElementTree as ET
+from anilist import iter_user_list, search_anime_by_ids, ID_PAGE_SIZE, INTERACTIVE
+
+MAX_IMPORT_ENTRIES = 5000
+READ_CHUNK = 64 * 1024
+# Large exports may take longer than any total timeout; only a stalled connection fails
+DOWNLOAD_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=30)
+
+# List statuses that map onto tracked_anime; dropped entries are skipped
+ANILIST_STATUSES = {
+    "CURRENT": "watching", "REPEATING": "watching", "PAUSED": "watching",
+    "COMPLETED": "watched", "PLANNING": "want_to_watch",
+}
+# MAL exports spell statuses out; older ones use the numeric codes
+MAL_STATUSES = {
+    "Watching": "watching", "On-Hold": "watching", "Completed": "watched", "Plan to Watch": "want_to_watch",
+    "1": "watching", "3": "watching", "2": "watched", "6": "want_to_watch",
+}
+
+
+# ---------------- SOURCES ----------------
+# Every source produces (media, episodes watched, status) entries, with media
+# carrying at least anilist.PROJECTIONS["titles"]. on_progress(text) is awaited
+# as the import advances.
+
+# The bytes of a Discord attachment as they download, without buffering the
+# file. Uses its own session so AniList's short total timeout doesn't apply.
+async def attachment_chunks(attachment):
+    try:
+        async with aiohttp.ClientSession(timeout=DOWNLOAD_TIMEOUT) as session, session.get(attachment.url) as response:
+            response.raise_for_status()
+            async for chunk in response.content.iter_chunked(READ_CHUNK):
+                yield chunk
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        raise ValueError("Couldn't download that file.")
+
+
+# Yields (mal_id, episodes watched, status) from a MAL XML export, plain or
+# gzipped, as its bytes arrive. Entries are discarded once read, so memory
+# stays flat however long the list is.
+async def iter_mal_export(chunks):
+    parser = ET.XMLPullParser(("end",))
+    inflate = None
+    async for chunk in chunks:
+        if inflate is None:
+            inflate = zlib.decompressobj(zlib.MAX_WBITS | 16) if chunk[:2] == b"\x1f\x8b" else False
+        try:
+            parser.feed(inflate.decompress(chunk) if inflate else chunk)
+            events = list(parser.read_events())
+        except (ET.ParseError, zlib.error):
+            raise ValueError("That file isn't a MyAnimeList export.")
+        for _, elem in events:
+            if elem.tag != "anime":
+                continue
+            mal_id, watched = elem.findtext("series_animedb_id"), elem.findtext("my_watched_episodes")
+            status = MAL_STATUSES.get((elem.findtext("my_status") or "").strip())
+            elem.clear()
+            yield int(mal_id) if (mal_id or "").strip().isdigit() else None, int(watched or 0), status
+    try:
+        parser.close()
+    except ET.ParseError:
+        raise ValueError("That MyAnimeList export is incomplete.")
+
+
+# (entries, skipped) for a MAL export; ids are matched to AniList in id_in batches
+async def mal_entries(chunks, on_progress, concurrency=4):
+    wanted, skipped = {}, 0
+    async for mal_id, watched, status in iter_mal_export(chunks):
+        if mal_id is None or status is None:
+            skipped += 1
+            continue
+        wanted[mal_id] = (watched, status)
+        if len(wanted) > MAX_IMPORT_ENTRIES:
+            raise ValueError(f"Imports are limited to {MAX_IMPORT_ENTRIES} anime.")
+        if len(wanted) % 250 == 0:
+            await on_progress(f"📥 Read {len(wanted)} entries…")
+
+    entries, ids, batch = [], list(wanted), ID_PAGE_SIZE * concurrency
+    for i in range(0, len(ids), batch):
+        found = await search_anime_by_ids(
+            ids[i:i + batch], concurrency=concurrency, priority=INTERACTIVE, projection="titles", key="idMal"
+        )
+        entries += [(media, *wanted[mal_id]) for mal_id, media in found.items()]
+        await on_progress(f"🔎 Matched {len(entries)}/{len(ids)} anime on AniList…")
+    return entries, skipped + len(ids) - len(entries)
+
+
+# (entries, skipped) for an AniList user's list, read in chunks
+async def anilist_entries(username, on_progress):
+    entries, skipped = [], 0
+    async for chunk in iter_user_list(username, priority=INTERACTIVE):
+        for e in chunk:
+            if (status := ANILIST_STATUSES.get(e.get("status"))) and e.get("media"):
+                entries.append((e["media"], e.get("progress") or 0, status))
+            else:
+                skipped += 1
+        if len(entries) > MAX_IMPORT_ENTRIES:
+            raise ValueError(f"Imports are limited to {MAX_IMPORT_ENTRIES} anime.")
+        await on_progress(f"📥 Read {len(entries)} entries…")
+    return entries, skipped
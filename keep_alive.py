@@ -1,15 +1,52 @@
-from flask import Flask
-from threading import Thread
+import asyncio
+import os
+from aiohttp import web
+from metrics import render_metrics, health
 
-app = Flask('')
+HOST = os.getenv("HOST") or "0.0.0.0"
+PORT = int(os.getenv("PORT") or 8080)
 
-@app.route('/')
-def home():
-    return "I am alive!"
 
-def run():
-    app.run(host='0.0.0.0', port=8080)
+# ---------------- KEEP-ALIVE / HEALTH SERVER ----------------
+# Runs on the bot's own event loop (started from setup_hook), so handlers read
+# live bot state without locks or a second thread.
+class KeepAlive:
+    def __init__(self, bot, host=HOST, port=PORT):
+        self.bot = bot
+        self.host = host
+        self.port = port
+        self._runner = None
 
-def keep_alive():
-    t = Thread(target=run)
-    t.start()
\ No newline at end of file
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/", self.home)
+        app.router.add_get("/metrics", self.metrics)
+        app.router.add_get("/healthz", self.healthz)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        print(f"✅ Keep-alive server listening on {self.host}:{self.port}.")
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def home(self, request):
+        return web.Response(text="I am alive!")
+
+    async def metrics(self, request):
+        body, content_type = render_metrics()
+        return web.Response(body=body, headers={"Content-Type": content_type})
+
+    async def healthz(self, request):
+        report = health()
+        latency = self.bot.latency
+        report.update({
+            "ok": report["ok"] and not self.bot.is_closed(),
+            "ready": self.bot.is_ready(),
+            "gateway_latency_ms": round(latency * 1000, 1) if latency == latency else None,  # NaN before the first heartbeat
+            "guilds": len(self.bot.guilds),
+            "tasks": len(asyncio.all_tasks()),
+        })
+        return web.json_response(report, status=200 if report["ok"] else 503)
@@ -0,0 +1,88 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict, defaultdict
+from anilist import RateLimiter
+
+# Skip chunking and the member cache; resolve tracked users on demand instead
+LOW_MEMORY_MEMBERS = os.getenv("LOW_MEMORY_MEMBERS", "").lower() in ("1", "true", "yes")
+MEMBER_TTL = int(os.getenv("MEMBER_TTL") or 600)   # how stale a member's roles may get
+ABSENT_TTL = int(os.getenv("MEMBER_ABSENT_TTL") or 6 * 3600)  # how long a user counts as not in a guild
+# member queries per shard and minute; the gateway allows ~120 ops of any kind
+MEMBER_QUERY_RATE = int(os.getenv("MEMBER_QUERY_RATE") or 60)
+MEMBER_CACHE_SIZE = int(os.getenv("MEMBER_CACHE_SIZE") or 20_000)
+QUERY_BATCH = 100  # Discord's cap on user_ids per member request
+
+_ABSENT = object()
+
+
+# ---------------- MEMBER RESOLVER ----------------
+# In the default mode members come from discord.py's own cache. In low-memory
+# mode only the user ids the notifier asks about are fetched, with batched
+# guild.query_members(user_ids=...) calls, and kept (roles included) in a small
+# LRU for MEMBER_TTL seconds. Users who aren't in a guild are cached as absent
+# for the much longer ABSENT_TTL, so once a user has been looked up, only the
+# guilds they are in are queried again; joining another guild, or running a
+# command there, records them there at once. Queries go through a per-shard
+# token bucket to stay inside the gateway's rate limit.
+class MemberResolver:
+    def __init__(self, low_memory=LOW_MEMORY_MEMBERS, ttl=MEMBER_TTL, maxsize=MEMBER_CACHE_SIZE,
+                 absent_ttl=ABSENT_TTL, query_rate=MEMBER_QUERY_RATE):
+        self.low_memory = low_memory
+        self.ttl = ttl
+        self.absent_ttl = absent_ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict()  # (guild_id, user_id) -> (member or _ABSENT, expires_at)
+        self._limiters = defaultdict(lambda: RateLimiter(query_rate, 60.0, reserve=0))  # shard_id -> bucket
+        self.queries = 0
+
+    def remember(self, guild_id, user_id, member):
+        ttl = self.ttl if member is not None else self.absent_ttl
+        self._entries[(guild_id, user_id)] = (member if member is not None else _ABSENT, time.time() + ttl)
+        self._entries.move_to_end((guild_id, user_id))
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def forget(self, guild_id, user_id):
+        self._entries.pop((guild_id, user_id), None)
+
+    def _cached(self, guild_id, user_id):
+        entry = self._entries.get((guild_id, user_id))
+        if entry is None or entry[1] <= time.time():
+            return None
+        return entry[0]
+
+    # {user_id: member} for the user_ids that belong to guild
+    async def resolve(self, guild, user_ids):
+        if not self.low_memory:
+            return {u: m for u in user_ids if (m := guild.get_member(u))}
+
+        found, missing = {}, []
+        for u in user_ids:
+            if (m := guild.get_member(u) or self._cached(guild.id, u)) is None:
+                missing.append(u)
+            elif m is not _ABSENT:
+                found[u] = m
+
+        async def query(batch):
+            await self._limiters[guild.shard_id].acquire()
+            self.queries += 1
+            try:
+                members = await guild.query_members(user_ids=batch, limit=len(batch), cache=False)
+            except asyncio.TimeoutError:
+                print(f"Member query timed out in guild {guild.id}.")
+                return batch, None
+            return batch, {m.id: m for m in members}
+
+        batches = [missing[i:i + QUERY_BATCH] for i in range(0, len(missing), QUERY_BATCH)]
+        for batch, members in await asyncio.gather(*(query(b) for b in batches)):
+            if members is None:
+                continue
+            for u in batch:
+                self.remember(guild.id, u, members.get(u))
+                if u in members:
+                    found[u] = members[u]
+        return found
+
+
+member_resolver = MemberResolver()
@@ -0,0 +1,154 @@
+import asyncio
+import contextlib
+import os
+import time
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest, REGISTRY
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+HEALTH_MAX_LOOP_LAG = float(os.getenv("HEALTH_MAX_LOOP_LAG") or 1.0)              # seconds
+HEALTH_MAX_SWEEP_AGE = float(os.getenv("HEALTH_MAX_SWEEP_AGE") or 13 * 3600)      # two missed 6h sweeps
+LOOP_LAG_INTERVAL = 1.0
+
+FAST_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5)
+SLOW_BUCKETS = (.05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+# ---------------- ANILIST ----------------
+ANILIST_SECONDS = Histogram("anilist_request_seconds", "AniList HTTP round trip per attempt", ["query"])
+ANILIST_THROTTLED = Counter("anilist_throttled", "AniList 429 responses", ["query"])
+ANILIST_ERRORS = Counter("anilist_errors", "Failed AniList attempts by reason", ["query", "reason"])
+
+# ---------------- DATABASE ----------------
+DB_ACQUIRE_SECONDS = Histogram("db_acquire_seconds", "Wait for a database connection", ["backend"],
+                               buckets=FAST_BUCKETS)
+DB_QUERY_SECONDS = Histogram("db_query_seconds", "database.py call latency", ["function"], buckets=FAST_BUCKETS)
+
+# ---------------- SLASH COMMANDS ----------------
+COMMAND_SECONDS = Histogram("command_seconds", "Slash command handler latency", ["command", "outcome"])
+COMMAND_FOLLOWUP_SECONDS = Histogram("command_followup_seconds",
+                                     "Time from defer to the handler finishing its followup", ["command"])
+
+# ---------------- NOTIFIER ----------------
+NOTIFIER_SWEEP_SECONDS = Histogram("notifier_sweep_seconds", "Airing plan sweeps and episode fan-outs", ["kind"],
+                                   buckets=SLOW_BUCKETS)
+NOTIFIER_ROWS_SCANNED = Counter("notifier_rows_scanned", "tracked_anime rows read by the notifier")
+NOTIFICATIONS_SENT = Counter("notifications_sent", "Episode notifications delivered", ["channel"])
+NOTIFIER_LAST_SWEEP = Gauge("notifier_last_sweep_timestamp_seconds", "Unix time of the last successful sweep")
+
+# ---------------- STARTUP ----------------
+STARTUP_PHASE_SECONDS = Gauge("startup_phase_seconds", "Time spent in each setup_hook phase", ["phase"])
+startup_phases = {}
+
+
+@contextlib.contextmanager
+def startup_phase(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_phases[name] = time.perf_counter() - start
+        STARTUP_PHASE_SECONDS.labels(name).set(startup_phases[name])
+
+
+# ---------------- EVENT LOOP ----------------
+LOOP_LAG = Gauge("event_loop_lag_seconds", "How late a 1s asyncio.sleep woke up")
+
+_started_at = time.time()
+last_sweep_at = None
+loop_lag = 0.0
+
+
+def observe_command(command, outcome, started, deferred=None):
+    now = time.perf_counter()
+    COMMAND_SECONDS.labels(command, outcome).observe(now - started)
+    if deferred is not None:
+        COMMAND_FOLLOWUP_SECONDS.labels(command).observe(now - deferred)
+
+
+def mark_sweep():
+    global last_sweep_at
+    last_sweep_at = time.time()
+    NOTIFIER_LAST_SWEEP.set(last_sweep_at)
+
+
+async def monitor_loop_lag(interval=LOOP_LAG_INTERVAL):
+    global loop_lag
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        loop_lag = max(0.0, time.perf_counter() - start - interval)
+        LOOP_LAG.set(loop_lag)
+
+
+# ---------------- CACHES ----------------
+# Reads MediaCache counters at scrape time instead of touching the hot path
+class _CacheCollector:
+    def __init__(self, caches):
+        self.caches = caches
+
+    def collect(self):
+        hits = CounterMetricFamily("cache_hits", "Cache lookups served from memory", labels=["cache"])
+        misses = CounterMetricFamily("cache_misses", "Cache lookups that had to fetch", labels=["cache"])
+        evictions = CounterMetricFamily("cache_evictions", "Entries dropped to stay within maxsize", labels=["cache"])
+        ratio = GaugeMetricFamily("cache_hit_ratio", "Hits over lookups since start", labels=["cache"])
+        size = GaugeMetricFamily("cache_entries", "Entries held", labels=["cache"])
+        for name, cache in self.caches.items():
+            lookups = cache.hits + cache.misses
+            hits.add_metric([name], cache.hits)
+            misses.add_metric([name], cache.misses)
+            evictions.add_metric([name], cache.evictions)
+            ratio.add_metric([name], cache.hits / lookups if lookups else 0.0)
+            size.add_metric([name], len(cache))
+        yield from (hits, misses, evictions, ratio, size)
+
+
+def watch_caches(**caches):
+    REGISTRY.register(_CacheCollector(caches))
+
+
+# ---------------- DATABASE POOL ----------------
+# stats() returns the backend's Storage.stats(); size and in_use only exist for pooled backends
+POOL_GAUGES = {
+    "size": "Connections open in the pool",
+    "in_use": "Connections checked out of the pool",
+    "waiting": "Callers waiting for a connection",
+}
+_pool_stats = dict
+
+
+class _PoolCollector:
+    def collect(self):
+        stats = _pool_stats()
+        for field, documentation in POOL_GAUGES.items():
+            gauge = GaugeMetricFamily(f"db_pool_{field}", documentation, labels=["backend"])
+            if field in stats:
+                gauge.add_metric([stats["backend"]], stats[field])
+            yield gauge
+
+
+def watch_pool(stats):
+    global _pool_stats
+    _pool_stats = stats
+    REGISTRY.register(_PoolCollector())
+
+
+# ---------------- EXPOSITION ----------------
+def render_metrics():
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+# Unhealthy when the loop is stalling or the notifier hasn't swept for too long
+def health():
+    now = time.time()
+    pool = _pool_stats()
+    sweep_age = now - (last_sweep_at or _started_at)
+    ok = loop_lag <= HEALTH_MAX_LOOP_LAG and sweep_age <= HEALTH_MAX_SWEEP_AGE
+    return {
+        "ok": ok,
+        "event_loop_lag_ms": round(loop_lag * 1000, 1),
+        "last_sweep_at": last_sweep_at,
+        "last_sweep_age_s": round(sweep_age, 1) if last_sweep_at else None,
+        "uptime_s": round(now - _started_at, 1),
+        "startup_ms": {name: round(seconds * 1000, 1) for name, seconds in startup_phases.items()},
+        "db_pool": {field: pool[field] for field in POOL_GAUGES if field in pool},
+    }
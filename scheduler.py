@@ -0,0 +1,134 @@
+import asyncio
+import heapq
+import itertools
+import time
+
+RETRY_DELAY = 120        # AniList unreachable when an episode came due
+RECHECK_DELAY = 15 * 60  # AniList hasn't rolled nextAiringEpisode forward yet
+
+
+# ---------------- AIRING SCHEDULER ----------------
+# Keeps the next airing episode of every tracked anime in a min-heap keyed on
+# airingAt and sleeps until the earliest one is due, so nothing touches AniList
+# or the database between episodes.
+#
+# fetch(ids) -> {anime_id: media} must return fresh nextAiringEpisode data.
+# notify(media, episode) sends the notifications for one aired episode.
+class AiringScheduler:
+    def __init__(self, fetch, notify):
+        self._fetch = fetch
+        self._notify = notify
+        self._heap = []      # (airing_at, seq, anime_id, episode); episode None = refresh only
+        self._seq = itertools.count()
+        self._planned = {}   # anime_id -> (airing_at, episode), the live heap entry
+        self._finished = set()  # anime with no next episode as of the last fetch; cleared by plan()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._firing = set()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    # ---------------- PLANNING ----------------
+    # Replaces the whole plan with the schedule of anime_ids
+    async def plan(self, anime_ids):
+        anime_ids = set(anime_ids)
+        media = await self._fetch(list(anime_ids)) if anime_ids else {}
+        for anime_id in list(self._planned):
+            if anime_id not in anime_ids:
+                self.discard(anime_id)
+        self._finished.clear()
+        self._plan_fetched(media)
+
+    # Makes sure a (newly) tracked anime is scheduled; free if it already is or
+    # has nothing left to air
+    async def replan(self, anime_id):
+        await self.replan_many([anime_id])
+
+    # ... for many anime, fetching the unscheduled ones in one batch
+    async def replan_many(self, anime_ids):
+        missing = [i for i in anime_ids if i not in self._planned and i not in self._finished]
+        self._plan_fetched(await self._fetch(missing) if missing else {})
+
+    def _plan_fetched(self, media):
+        for anime_id, data in media.items():
+            if not self._plan_next(anime_id, data):
+                self._finished.add(anime_id)
+
+    def discard(self, anime_id):
+        # The heap entry is left behind and skipped lazily once it reaches the top
+        if self._planned.pop(anime_id, None) is not None:
+            self._wakeup.set()
+
+    def _plan_next(self, anime_id, data, after=None):
+        nxt = data.get("nextAiringEpisode")
+        if nxt and (after is None or nxt["episode"] > after):
+            self._push(anime_id, nxt["airingAt"], nxt["episode"])
+            return True
+        return False
+
+    def _push(self, anime_id, airing_at, episode):
+        if self._planned.get(anime_id) == (airing_at, episode):
+            return
+        self._planned[anime_id] = (airing_at, episode)
+        heapq.heappush(self._heap, (airing_at, next(self._seq), anime_id, episode))
+        if self._heap[0][2] == anime_id:
+            self._wakeup.set()
+
+    def _drop_stale(self):
+        while self._heap:
+            airing_at, _, anime_id, episode = self._heap[0]
+            if self._planned.get(anime_id) == (airing_at, episode):
+                return
+            heapq.heappop(self._heap)
+
+    # ---------------- RUN LOOP ----------------
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            self._drop_stale()
+            delay = self._heap[0][0] - time.time() if self._heap else None
+            if delay is None or delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, _, anime_id, episode = heapq.heappop(self._heap)
+            del self._planned[anime_id]
+            task = asyncio.create_task(self._fire(anime_id, episode))
+            self._firing.add(task)
+            task.add_done_callback(self._firing.discard)
+
+    async def _fire(self, anime_id, episode):
+        try:
+            data = (await self._fetch([anime_id])).get(anime_id)
+            if not data:
+                self._push(anime_id, time.time() + RETRY_DELAY, episode)
+                return
+
+            nxt = data.get("nextAiringEpisode")
+            if episode is not None:
+                # Delayed or rescheduled since we planned it
+                if nxt and nxt["episode"] == episode and nxt["airingAt"] > time.time():
+                    self._push(anime_id, nxt["airingAt"], episode)
+                    return
+                await self._notify(data, episode)
+
+            if not self._plan_next(anime_id, data, after=episode):
+                if episode is not None:
+                    self._push(anime_id, time.time() + RECHECK_DELAY, None)
+                else:
+                    self._finished.add(anime_id)
+        except Exception as e:
+            # Retry the same episode unless it was replanned meanwhile; the
+            # notifier's claim makes a second attempt safe for users already sent
+            print(f"Scheduler error for {anime_id}: {e}")
+            if anime_id not in self._planned:
+                self._push(anime_id, time.time() + RETRY_DELAY, episode)
@@ -0,0 +1,18 @@
+from storage.base import Storage
+
+SCHEMES = ("postgres://", "postgresql://", "sqlite://")
+
+
+# postgres://... or postgresql://... -> asyncpg pool
+# sqlite:///relative.db, sqlite:////absolute.db, sqlite://:memory: -> embedded SQLite
+def open_storage(url):
+    if url.startswith(("postgres://", "postgresql://")):
+        from storage.postgres import PostgresStorage
+        return PostgresStorage(url)
+    if url.startswith("sqlite://"):
+        from storage.sqlite import SQLiteStorage
+        path = url[len("sqlite://"):]
+        if path in ("", ":memory:", "/:memory:"):
+            return SQLiteStorage(":memory:")
+        return SQLiteStorage(path[1:] if path.startswith("/") else path)
+    raise RuntimeError(f"Unsupported DATABASE_URL scheme, expected one of {', '.join(SCHEMES)}")
@@ -0,0 +1,264 @@
+import abc
+import json
+import time
+import contextlib
+from metrics import DB_ACQUIRE_SECONDS
+
+WATCH_STATUSES = ("watching", "watched", "want_to_watch")
+
+
+# ---------------- INSTRUMENTATION ----------------
+# [count, total seconds, max seconds]
+def new_stat():
+    return [0, 0.0, 0.0]
+
+
+def observe(stat, seconds):
+    stat[0] += 1
+    stat[1] += seconds
+    stat[2] = max(stat[2], seconds)
+
+
+def summary(stat):
+    count, total, peak = stat
+    return {"count": count, "avg_ms": total / count * 1000 if count else 0.0, "max_ms": peak * 1000}
+
+
+# ---------------- LIST PAGES ----------------
+# Keyset pagination over one status of a user's list in (anime_name, anime_id)
+# order. A cursor is None for the first page or (op, anime_id) for the page
+# after, before or starting at that row, so every page costs the same however
+# deep it is. param(n) renders the backend's nth placeholder.
+KEYSET_OPS = {"after": (">", "ASC"), "before": ("<", "DESC"), "from": (">=", "ASC")}
+
+
+def list_page_sql(cursor, param):
+    anchor, order = "", "ASC"
+    if cursor:
+        op, order = KEYSET_OPS[cursor[0]]
+        anchor = f"""AND (anime_name, anime_id) {op} (
+                SELECT anime_name, anime_id FROM tracked_anime WHERE user_id = {param(1)} AND anime_id = {param(4)}
+            )"""
+    return f"""
+        SELECT anime_name, alias, last_watched, anime_id
+        FROM tracked_anime
+        WHERE user_id = {param(1)} AND status = {param(2)}
+            {anchor}
+        ORDER BY anime_name {order}, anime_id {order}
+        LIMIT {param(3)}
+    """
+
+
+COUNT_BY_STATUS_SQL = "SELECT status, count(*) FROM tracked_anime WHERE user_id = {} GROUP BY status"
+
+
+# ---------------- ANILIST MEDIA ROWS ----------------
+MEDIA_COLUMNS = """
+    anime_id, title, episodes, genres, cover_large, cover_medium, cover_color,
+    description, next_episode, next_airing_at, title_english, synonyms, fetched_at
+"""
+
+
+# (anime_id, title, episodes, genres, cover_large, cover_medium, cover_color,
+#  description, next_episode, next_airing_at, title_english, synonyms)
+def media_to_row(m):
+    cover = m.get("coverImage") or {}
+    nxt = m.get("nextAiringEpisode") or {}
+    return (
+        m["id"], m["title"]["romaji"], m.get("episodes"), m.get("genres") or [],
+        cover.get("large"), cover.get("medium"), cover.get("color"),
+        m.get("description"), nxt.get("episode"), nxt.get("airingAt"),
+        m["title"].get("english"), m.get("synonyms") or [],
+    )
+
+
+# SQLite keeps arrays as JSON text
+def _array(value):
+    return list(json.loads(value) if isinstance(value, str) else value or [])
+
+
+def media_from_row(r):
+    return {
+        "id": r["anime_id"],
+        "title": {"romaji": r["title"], "english": r["title_english"]},
+        "synonyms": _array(r["synonyms"]),
+        "episodes": r["episodes"],
+        "genres": _array(r["genres"]),
+        "coverImage": {"large": r["cover_large"], "medium": r["cover_medium"], "color": r["cover_color"]},
+        "description": r["description"],
+        "nextAiringEpisode": (
+            {"episode": r["next_episode"], "airingAt": r["next_airing_at"]}
+            if r["next_episode"] is not None else None
+        ),
+    }
+
+
+# ---------------- STORAGE INTERFACE ----------------
+# Everything database.py needs from a backend. Rows come back as mappings that
+# also index and unpack like tuples (asyncpg.Record, sqlite3.Row). Alias
+# clashes raise ValueError so callers never see driver exceptions. Every
+# abstract method must be implemented; tests/test_storage.py checks behaviour.
+class Storage(abc.ABC):
+    name = "storage"
+
+    def __init__(self):
+        self._acquire_stats = new_stat()
+        self._acquire_waiting = 0
+
+    # Times the wait for a connection; every backend call goes through here once
+    @contextlib.asynccontextmanager
+    async def _timed_acquire(self, acquire, release):
+        start = time.perf_counter()
+        self._acquire_waiting += 1
+        try:
+            conn = await acquire()
+        finally:
+            self._acquire_waiting -= 1
+        waited = time.perf_counter() - start
+        observe(self._acquire_stats, waited)
+        DB_ACQUIRE_SECONDS.labels(self.name).observe(waited)
+        try:
+            yield conn
+        finally:
+            await release(conn)
+
+    def stats(self):
+        return {"backend": self.name, "waiting": self._acquire_waiting, "acquire": summary(self._acquire_stats)}
+
+    @abc.abstractmethod
+    async def connect(self):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def close(self):
+        raise NotImplementedError
+
+    # Returns True if a row was inserted, False if the anime was already tracked
+    @abc.abstractmethod
+    async def add_anime(self, user_id, anime_id, anime_name, alias, episode, status):
+        raise NotImplementedError
+
+    # rows: (anime_id, anime_name, alias, last_watched, status) for one user, bulk
+    # loaded in one transaction. Untracked anime are inserted; tracked ones only
+    # have last_watched moved forward. Returns (anime_id, alias, anime_name,
+    # last_notified, status, inserted) for every row it changed.
+    @abc.abstractmethod
+    async def import_tracked(self, user_id, rows):
+        raise NotImplementedError
+
+    # Both return the row's last_notified (0 if never), or None if it isn't tracked
+    @abc.abstractmethod
+    async def update_progress(self, user_id, anime_id, episode):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def update_status(self, user_id, anime_id, status):
+        raise NotImplementedError
+
+    # rows: (user_id, anime_id, last_watched, status), applied in one transaction;
+    # rows that are no longer tracked are skipped
+    @abc.abstractmethod
+    async def apply_progress_many(self, rows):
+        raise NotImplementedError
+
+    # Compare-and-set last_notified to episode for user_ids; returns the users
+    # whose row moved, i.e. the ones this caller now has to notify
+    @abc.abstractmethod
+    async def claim_notifications(self, anime_id, episode, user_ids):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def update_alias(self, user_id, anime_id, new_alias):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def get_progress(self, user_id, identifier):
+        raise NotImplementedError
+
+    # (rows, {status: count}): up to limit (anime_name, alias, last_watched,
+    # anime_id) rows in list order (see list_page_sql) and the user's per-status totals
+    @abc.abstractmethod
+    async def list_page(self, user_id, status, limit, cursor=None):
+        raise NotImplementedError
+
+    # (anime_id, alias, anime_name) tuples for the alias index
+    @abc.abstractmethod
+    async def alias_rows(self, user_id):
+        raise NotImplementedError
+
+    # (anime_name, alias, last_watched, anime_id, status, last_notified) of every row the user tracks
+    @abc.abstractmethod
+    async def progress_rows(self, user_id):
+        raise NotImplementedError
+
+    # (anime_id, user_id, last_notified) of every row that gets alerts
+    @abc.abstractmethod
+    async def tracker_rows(self):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def get_tracked_anime_ids(self):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def get_trackers(self, anime_id):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def remove_anime(self, user_id, anime_id):
+        raise NotImplementedError
+
+    # rows: media_to_row() tuples
+    @abc.abstractmethod
+    async def upsert_media(self, rows):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def get_media(self, anime_ids):
+        raise NotImplementedError
+
+    # Most recently fetched first, as (media, fetched_at epoch seconds)
+    @abc.abstractmethod
+    async def load_media(self, limit):
+        raise NotImplementedError
+
+    # (anime_id, title, title_english, synonyms) for every stored media row, plus
+    # (anime_id, anime_name, None, []) for tracked anime without one
+    @abc.abstractmethod
+    async def title_rows(self):
+        raise NotImplementedError
+
+    # ---------------- GUILD CONFIG ----------------
+    # (guild_id, alert_channel_id, alert_role_id, timezone) rows
+    @abc.abstractmethod
+    async def get_guild_configs(self):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def set_guild_config(self, guild_id, alert_channel_id, alert_role_id, timezone):
+        raise NotImplementedError
+
+    # ---------------- BOT META ----------------
+    # Small key/value store for bot bookkeeping; None for unknown keys
+    @abc.abstractmethod
+    async def get_meta(self, key):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def set_meta(self, key, value):
+        raise NotImplementedError
+
+    # ---------------- CHANGE FEED ----------------
+    # Calls on_change(anime_id, user_id, last_notified, alerting) for every
+    # committed tracked_anime change, from any process, and on_lost() if the feed
+    # breaks. Returns False when the backend has no feed (one process only, which
+    # sees its own writes through database.py). Idempotent while the feed is up.
+    async def listen_trackers(self, on_change, on_lost):
+        return False
+
+    # ---------------- NOTIFIER PARTITIONS ----------------
+    # Claims this process's fair share of partitions 0..count-1 among the
+    # replicas of its shard group and returns the ones it holds. A single
+    # process owns them all unless the backend can coordinate several.
+    async def rebalance_partitions(self, count, group=0):
+        return frozenset(range(count))
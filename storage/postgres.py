@@ -0,0 +1,495 @@
+import os
+import json
+import asyncio
+import asyncpg
+from storage.base import Storage, MEDIA_COLUMNS, media_from_row, list_page_sql, COUNT_BY_STATUS_SQL
+
+DB_SSL = os.getenv("DB_SSL") or "require"  # asyncpg sslmode; "disable" for local databases
+
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN") or 1)
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX") or 4)
+# Only safe when connecting directly or through a session-mode pooler; transaction
+# poolers (PgBouncer, Supabase :6543) break server-side prepared statements.
+DB_PREPARED_STATEMENTS = os.getenv("DB_PREPARED_STATEMENTS", "").lower() in ("1", "true", "yes")
+
+
+# ---------------- MIGRATIONS ----------------
+# Applied in order by connect(); entry N brings the schema to version N + 1.
+# Never edit an entry once it has shipped, append a new one instead.
+MIGRATIONS = [
+    # 1: base tables
+    """
+    CREATE TABLE IF NOT EXISTS tracked_anime (
+        user_id BIGINT,
+        anime_id INTEGER,
+        anime_name TEXT,
+        alias TEXT,
+        last_watched INTEGER DEFAULT 0,
+        last_notified INTEGER DEFAULT 0,
+        status TEXT DEFAULT 'watching',
+        PRIMARY KEY (user_id, anime_id)
+    );
+    CREATE TABLE IF NOT EXISTS anime_media (
+        anime_id INTEGER PRIMARY KEY,
+        title TEXT,
+        episodes INTEGER,
+        genres TEXT[],
+        cover_large TEXT,
+        cover_medium TEXT,
+        cover_color TEXT,
+        description TEXT,
+        next_episode INTEGER,
+        next_airing_at BIGINT,
+        fetched_at TIMESTAMPTZ DEFAULT now()
+    );
+    """,
+    # 2: indexes for the hot lookups, unique aliases per user, enum status
+    """
+    UPDATE tracked_anime AS t
+    SET alias = t.alias || '-' || t.anime_id
+    FROM (
+        SELECT user_id, anime_id,
+               row_number() OVER (PARTITION BY user_id, alias ORDER BY anime_id) AS n
+        FROM tracked_anime
+    ) AS d
+    WHERE t.user_id = d.user_id AND t.anime_id = d.anime_id AND d.n > 1;
+
+    CREATE TYPE watch_status AS ENUM ('watching', 'watched', 'want_to_watch');
+    UPDATE tracked_anime SET status = 'watching'
+    WHERE status IS NULL OR status NOT IN ('watching', 'watched', 'want_to_watch');
+    ALTER TABLE tracked_anime
+        ALTER COLUMN status DROP DEFAULT,
+        ALTER COLUMN status TYPE watch_status USING status::watch_status,
+        ALTER COLUMN status SET DEFAULT 'watching';
+
+    CREATE UNIQUE INDEX tracked_anime_user_alias ON tracked_anime (user_id, alias);
+    CREATE INDEX tracked_anime_user_name ON tracked_anime (user_id, anime_name);
+    CREATE INDEX tracked_anime_user_status_name ON tracked_anime (user_id, status, anime_name);
+    CREATE INDEX tracked_anime_anime_id ON tracked_anime (anime_id);
+    """,
+    # 3: per-guild notification settings
+    """
+    CREATE TABLE guild_config (
+        guild_id BIGINT PRIMARY KEY,
+        alert_channel_id BIGINT,
+        alert_role_id BIGINT,
+        timezone TEXT
+    );
+    """,
+    # 4: bookkeeping such as the last synced command tree
+    """
+    CREATE TABLE bot_meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+    """,
+    # 5: anime_id breaks title ties, so keyset list pages are an index range
+    """
+    DROP INDEX tracked_anime_user_status_name;
+    CREATE INDEX tracked_anime_user_status_name ON tracked_anime (user_id, status, anime_name, anime_id);
+    """,
+    # 6: change feed for the notifier projection; only changes it cares about are sent
+    """
+    CREATE FUNCTION tracked_anime_notify() RETURNS trigger AS $$
+    DECLARE
+        r tracked_anime;
+    BEGIN
+        IF TG_OP = 'UPDATE' AND NEW.status = OLD.status
+           AND NEW.last_notified IS NOT DISTINCT FROM OLD.last_notified THEN
+            RETURN NULL;
+        END IF;
+        IF TG_OP = 'DELETE' THEN r := OLD; ELSE r := NEW; END IF;
+        PERFORM pg_notify('tracked_anime', json_build_object(
+            'anime_id', r.anime_id,
+            'user_id', r.user_id,
+            'last_notified', coalesce(r.last_notified, 0),
+            'alerting', TG_OP <> 'DELETE' AND r.status <> 'watched'
+        )::text);
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql;
+
+    CREATE TRIGGER tracked_anime_notify
+        AFTER INSERT OR UPDATE OR DELETE ON tracked_anime
+        FOR EACH ROW EXECUTE FUNCTION tracked_anime_notify();
+    """,
+    # 7: every title variant, for the /track title index
+    """
+    ALTER TABLE anime_media
+        ADD COLUMN title_english TEXT,
+        ADD COLUMN synonyms TEXT[] NOT NULL DEFAULT '{}';
+    """,
+]
+MIGRATION_LOCK = 7_201_001  # advisory lock so concurrent boots migrate one at a time
+
+# Two-key advisory locks held by the notifier lease connection. Replicas serving
+# the same shards form a group: each holds (MEMBER_LOCK, group) shared to mark
+# itself live, and (PARTITION_LOCK, group * PARTITION_SPACE + n) to own partition n.
+MEMBER_LOCK, PARTITION_LOCK = 7201, 7202
+PARTITION_SPACE = 65536
+LIVE_MEMBERS = """
+    SELECT count(*)
+    FROM pg_locks
+    WHERE locktype = 'advisory' AND granted AND objsubid = 2 AND classid = $1 AND objid = $2
+      AND database = (SELECT oid FROM pg_database WHERE datname = current_database())
+"""
+
+
+# ---------------- POSTGRES (asyncpg) ----------------
+class PostgresStorage(Storage):
+    name = "postgres"
+
+    def __init__(self, url):
+        super().__init__()
+        self.url = url
+        self.pool = None
+        self._lease = None          # dedicated connection holding the partition locks
+        self._lease_lock = asyncio.Lock()
+        self._held = set()
+        self._listener = None       # dedicated connection receiving tracked_anime changes
+
+    async def connect(self):
+        if self.pool is None:
+            self.pool = await asyncpg.create_pool(
+                dsn=self.url,
+                min_size=DB_POOL_MIN,
+                max_size=DB_POOL_MAX,
+                timeout=10,
+                ssl=DB_SSL,
+                statement_cache_size=100 if DB_PREPARED_STATEMENTS else 0
+            )
+        async with self._acquire() as conn:
+            await self._migrate(conn)
+
+    async def close(self):
+        await self._drop_lease()
+        if self._listener is not None:
+            self._listener.terminate()
+            self._listener = None
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    async def _migrate(self, conn):
+        async with conn.transaction():
+            await conn.execute("SELECT pg_advisory_xact_lock($1)", MIGRATION_LOCK)
+            await conn.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)")
+            version = await conn.fetchval("SELECT coalesce(max(version), 0) FROM schema_version")
+            for v, sql in enumerate(MIGRATIONS[version:], start=version + 1):
+                await conn.execute(sql)
+                await conn.execute("INSERT INTO schema_version (version) VALUES ($1)", v)
+                print(f"✅ Applied database migration {v}.")
+
+    def _acquire(self):
+        return self._timed_acquire(self.pool.acquire, self.pool.release)
+
+    def stats(self):
+        size = self.pool.get_size() if self.pool else 0
+        idle = self.pool.get_idle_size() if self.pool else 0
+        return {
+            **super().stats(),
+            "size": size,
+            "max_size": DB_POOL_MAX,
+            "in_use": size - idle,
+            "prepared_statements": DB_PREPARED_STATEMENTS,
+        }
+
+    # ---------------- TRACKED ANIME ----------------
+    async def add_anime(self, user_id, anime_id, anime_name, alias, episode, status):
+        async with self._acquire() as conn:
+            try:
+                result = await conn.execute("""
+                    INSERT INTO tracked_anime
+                    (user_id, anime_id, anime_name, alias, last_watched, last_notified, status)
+                    VALUES ($1, $2, $3, $4, $5, $5, $6)
+                    ON CONFLICT (user_id, anime_id) DO NOTHING
+                """, user_id, anime_id, anime_name, alias, episode, status)
+            except asyncpg.UniqueViolationError:
+                raise ValueError(f"Alias '{alias}' is already in use.")
+        return result.endswith(" 1")
+
+    # COPY into a per-connection staging table, then one merge into tracked_anime
+    async def import_tracked(self, user_id, rows):
+        async with self._acquire() as conn:
+            async with conn.transaction():
+                await conn.execute("""
+                    CREATE TEMP TABLE IF NOT EXISTS tracked_import (
+                        anime_id INTEGER, anime_name TEXT, alias TEXT, last_watched INTEGER, status TEXT
+                    ) ON COMMIT DELETE ROWS
+                """)
+                await conn.copy_records_to_table(
+                    "tracked_import", records=rows,
+                    columns=("anime_id", "anime_name", "alias", "last_watched", "status"),
+                )
+                try:
+                    return await conn.fetch("""
+                        INSERT INTO tracked_anime AS t
+                        (user_id, anime_id, anime_name, alias, last_watched, last_notified, status)
+                        SELECT $1, anime_id, anime_name, alias, last_watched, last_watched, status::watch_status
+                        FROM tracked_import
+                        ON CONFLICT (user_id, anime_id) DO UPDATE SET last_watched = EXCLUDED.last_watched
+                            WHERE t.last_watched < EXCLUDED.last_watched
+                        RETURNING anime_id, alias, anime_name, coalesce(last_notified, 0), status, xmax = 0
+                    """, user_id)
+                except asyncpg.UniqueViolationError:
+                    raise ValueError("An alias was taken while importing; try again.")
+
+    async def update_progress(self, user_id, anime_id, episode):
+        async with self._acquire() as conn:
+            return await conn.fetchval("""
+                UPDATE tracked_anime
+                SET last_watched = $1, status = 'watching'
+                WHERE user_id = $2 AND anime_id = $3
+                RETURNING coalesce(last_notified, 0)
+            """, episode, user_id, anime_id)
+
+    async def update_status(self, user_id, anime_id, status):
+        async with self._acquire() as conn:
+            return await conn.fetchval("""
+                UPDATE tracked_anime
+                SET status = $1
+                WHERE user_id = $2 AND anime_id = $3
+                RETURNING coalesce(last_notified, 0)
+            """, status, user_id, anime_id)
+
+    async def apply_progress_many(self, rows):
+        user_ids, anime_ids, episodes, statuses = zip(*rows)
+        async with self._acquire() as conn:
+            await conn.execute("""
+                UPDATE tracked_anime AS t
+                SET last_watched = v.last_watched, status = v.status::watch_status
+                FROM UNNEST($1::bigint[], $2::int[], $3::int[], $4::text[]) AS v(user_id, anime_id, last_watched, status)
+                WHERE t.user_id = v.user_id AND t.anime_id = v.anime_id
+            """, list(user_ids), list(anime_ids), list(episodes), list(statuses))
+
+    async def claim_notifications(self, anime_id, episode, user_ids):
+        async with self._acquire() as conn:
+            rows = await conn.fetch("""
+                UPDATE tracked_anime
+                SET last_notified = $2
+                WHERE anime_id = $1 AND user_id = ANY($3::bigint[])
+                  AND coalesce(last_notified, 0) < $2
+                RETURNING user_id
+            """, anime_id, episode, list(user_ids))
+        return [r["user_id"] for r in rows]
+
+    async def update_alias(self, user_id, anime_id, new_alias):
+        async with self._acquire() as conn:
+            try:
+                await conn.execute("""
+                    UPDATE tracked_anime
+                    SET alias = $1
+                    WHERE user_id = $2 AND anime_id = $3
+                """, new_alias, user_id, anime_id)
+            except asyncpg.UniqueViolationError:
+                raise ValueError(f"Alias '{new_alias}' is already in use.")
+
+    async def get_progress(self, user_id, identifier):
+        async with self._acquire() as conn:
+            return await conn.fetchrow("""
+                SELECT anime_name, alias, last_watched, anime_id, status
+                FROM tracked_anime
+                WHERE user_id = $1
+                  AND (alias = $2 OR anime_name = $2)
+            """, user_id, identifier)
+
+    async def list_page(self, user_id, status, limit, cursor=None):
+        args = (user_id, status, limit) + ((cursor[1],) if cursor else ())
+        async with self._acquire() as conn:
+            rows = await conn.fetch(list_page_sql(cursor, lambda n: f"${n}"), *args)
+            counts = await conn.fetch(COUNT_BY_STATUS_SQL.format("$1"), user_id)
+        if cursor and cursor[0] == "before":
+            rows.reverse()
+        return rows, dict(counts)
+
+    async def alias_rows(self, user_id):
+        async with self._acquire() as conn:
+            rows = await conn.fetch("""
+                SELECT anime_id, alias, anime_name
+                FROM tracked_anime
+                WHERE user_id = $1
+            """, user_id)
+        return [tuple(r) for r in rows]
+
+    async def progress_rows(self, user_id):
+        async with self._acquire() as conn:
+            return await conn.fetch("""
+                SELECT anime_name, alias, last_watched, anime_id, status, coalesce(last_notified, 0)
+                FROM tracked_anime
+                WHERE user_id = $1
+            """, user_id)
+
+    async def tracker_rows(self):
+        async with self._acquire() as conn:
+            return await conn.fetch("""
+                SELECT anime_id, user_id, coalesce(last_notified, 0)
+                FROM tracked_anime
+                WHERE status <> 'watched'
+            """)
+
+    async def get_tracked_anime_ids(self):
+        async with self._acquire() as conn:
+            rows = await conn.fetch("""
+                SELECT DISTINCT anime_id
+                FROM tracked_anime
+                WHERE status <> 'watched'
+            """)
+        return [r["anime_id"] for r in rows]
+
+    async def get_trackers(self, anime_id):
+        async with self._acquire() as conn:
+            return await conn.fetch("""
+                SELECT user_id, last_notified
+                FROM tracked_anime
+                WHERE anime_id = $1 AND status <> 'watched'
+            """, anime_id)
+
+    async def remove_anime(self, user_id, anime_id):
+        async with self._acquire() as conn:
+            await conn.execute("""
+                DELETE FROM tracked_anime
+                WHERE user_id = $1 AND anime_id = $2
+            """, user_id, anime_id)
+
+    # ---------------- ANILIST MEDIA ----------------
+    async def upsert_media(self, rows):
+        async with self._acquire() as conn:
+            await conn.executemany("""
+                INSERT INTO anime_media
+                (anime_id, title, episodes, genres, cover_large, cover_medium, cover_color,
+                 description, next_episode, next_airing_at, title_english, synonyms, fetched_at)
+                VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, now())
+                ON CONFLICT (anime_id) DO UPDATE SET
+                    title = EXCLUDED.title,
+                    episodes = EXCLUDED.episodes,
+                    genres = EXCLUDED.genres,
+                    cover_large = EXCLUDED.cover_large,
+                    cover_medium = EXCLUDED.cover_medium,
+                    cover_color = EXCLUDED.cover_color,
+                    description = EXCLUDED.description,
+                    next_episode = EXCLUDED.next_episode,
+                    next_airing_at = EXCLUDED.next_airing_at,
+                    title_english = EXCLUDED.title_english,
+                    synonyms = EXCLUDED.synonyms,
+                    fetched_at = EXCLUDED.fetched_at
+            """, rows)
+
+    async def get_media(self, anime_ids):
+        async with self._acquire() as conn:
+            rows = await conn.fetch(f"""
+                SELECT {MEDIA_COLUMNS}
+                FROM anime_media
+                WHERE anime_id = ANY($1::int[])
+            """, list(anime_ids))
+        return {r["anime_id"]: media_from_row(r) for r in rows}
+
+    async def load_media(self, limit):
+        async with self._acquire() as conn:
+            rows = await conn.fetch(f"""
+                SELECT {MEDIA_COLUMNS}
+                FROM anime_media
+                ORDER BY fetched_at DESC
+                LIMIT $1
+            """, limit)
+        return [(media_from_row(r), r["fetched_at"].timestamp()) for r in rows]
+
+    async def title_rows(self):
+        async with self._acquire() as conn:
+            return await conn.fetch("""
+                SELECT anime_id, title, title_english, synonyms FROM anime_media
+                UNION ALL
+                SELECT DISTINCT anime_id, anime_name, NULL, '{}'::text[] FROM tracked_anime t
+                WHERE NOT EXISTS (SELECT 1 FROM anime_media m WHERE m.anime_id = t.anime_id)
+            """)
+
+    # ---------------- GUILD CONFIG ----------------
+    async def get_guild_configs(self):
+        async with self._acquire() as conn:
+            return await conn.fetch("""
+                SELECT guild_id, alert_channel_id, alert_role_id, timezone
+                FROM guild_config
+            """)
+
+    async def set_guild_config(self, guild_id, alert_channel_id, alert_role_id, timezone):
+        async with self._acquire() as conn:
+            await conn.execute("""
+                INSERT INTO guild_config (guild_id, alert_channel_id, alert_role_id, timezone)
+                VALUES ($1, $2, $3, $4)
+                ON CONFLICT (guild_id) DO UPDATE SET
+                    alert_channel_id = EXCLUDED.alert_channel_id,
+                    alert_role_id = EXCLUDED.alert_role_id,
+                    timezone = EXCLUDED.timezone
+            """, guild_id, alert_channel_id, alert_role_id, timezone)
+
+    # ---------------- BOT META ----------------
+    async def get_meta(self, key):
+        async with self._acquire() as conn:
+            return await conn.fetchval("SELECT value FROM bot_meta WHERE key = $1", key)
+
+    async def set_meta(self, key, value):
+        async with self._acquire() as conn:
+            await conn.execute("""
+                INSERT INTO bot_meta (key, value) VALUES ($1, $2)
+                ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value
+            """, key, value)
+
+    # ---------------- CHANGE FEED ----------------
+    # LISTEN needs a connection of its own: pooled ones are reset on release
+    async def listen_trackers(self, on_change, on_lost):
+        if self._listener is not None and not self._listener.is_closed():
+            return True
+
+        def changed(conn, pid, channel, payload):
+            e = json.loads(payload)
+            on_change(e["anime_id"], e["user_id"], e["last_notified"], e["alerting"])
+
+        def lost(conn):
+            if conn is self._listener:
+                self._listener = None
+                on_lost()
+
+        self._listener = await asyncpg.connect(dsn=self.url, ssl=DB_SSL, statement_cache_size=0, timeout=10)
+        self._listener.add_termination_listener(lost)
+        await self._listener.add_listener("tracked_anime", changed)
+        return True
+
+    # ---------------- NOTIFIER PARTITIONS ----------------
+    # Session advisory locks live on a connection of their own, so they are
+    # released by Postgres the moment a replica dies and its connection drops.
+    # Needs a direct or session-mode connection, not a transaction pooler.
+    async def rebalance_partitions(self, count, group=0):
+        base = group * PARTITION_SPACE
+        async with self._lease_lock:
+            try:
+                if self._lease is None or self._lease.is_closed():
+                    await self._drop_lease()
+                    self._lease = await asyncpg.connect(dsn=self.url, ssl=DB_SSL, statement_cache_size=0, timeout=10)
+                    await self._lease.execute("SELECT pg_advisory_lock_shared($1, $2)", MEMBER_LOCK, group)
+
+                members = await self._lease.fetchval(LIVE_MEMBERS, MEMBER_LOCK, group)
+                share = -(-count // max(1, members))
+                for partition in sorted(self._held, reverse=True)[:max(0, len(self._held) - share)]:
+                    await self._lease.execute("SELECT pg_advisory_unlock($1, $2)", PARTITION_LOCK, base + partition)
+                    self._held.discard(partition)
+
+                # Start at a per-replica offset so joining replicas don't all race for partition 0
+                start = self._lease.get_server_pid() % count
+                for i in range(count):
+                    if len(self._held) >= share:
+                        break
+                    partition = (start + i) % count
+                    if partition not in self._held and await self._lease.fetchval(
+                        "SELECT pg_try_advisory_lock($1, $2)", PARTITION_LOCK, base + partition
+                    ):
+                        self._held.add(partition)
+            except (asyncpg.PostgresError, asyncpg.InterfaceError, OSError, asyncio.TimeoutError):
+                # The locks may be gone with the connection; hold nothing until reconnected
+                await self._drop_lease()
+                raise
+            return frozenset(self._held)
+
+    async def _drop_lease(self):
+        self._held = set()
+        if self._lease is not None:
+            self._lease.terminate()
+            self._lease = None
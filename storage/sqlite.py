@@ -0,0 +1,413 @@
+import json
+import time
+import asyncio
+import sqlite3
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from storage.base import Storage, MEDIA_COLUMNS, media_from_row, list_page_sql, COUNT_BY_STATUS_SQL
+
+MEDIA_BATCH = 500  # ids per IN (...) list, well under SQLite's bound-parameter limit
+
+
+# ---------------- MIGRATIONS ----------------
+# Same schema as the Postgres migrations: the status enum becomes a CHECK
+# constraint, genres are JSON text and fetched_at is epoch seconds.
+MIGRATIONS = [
+    # 1: tables and indexes
+    """
+    CREATE TABLE IF NOT EXISTS tracked_anime (
+        user_id INTEGER,
+        anime_id INTEGER,
+        anime_name TEXT,
+        alias TEXT,
+        last_watched INTEGER DEFAULT 0,
+        last_notified INTEGER DEFAULT 0,
+        status TEXT NOT NULL DEFAULT 'watching'
+            CHECK (status IN ('watching', 'watched', 'want_to_watch')),
+        PRIMARY KEY (user_id, anime_id)
+    );
+    CREATE UNIQUE INDEX tracked_anime_user_alias ON tracked_anime (user_id, alias);
+    CREATE INDEX tracked_anime_user_name ON tracked_anime (user_id, anime_name);
+    CREATE INDEX tracked_anime_user_status_name ON tracked_anime (user_id, status, anime_name);
+    CREATE INDEX tracked_anime_anime_id ON tracked_anime (anime_id);
+
+    CREATE TABLE IF NOT EXISTS anime_media (
+        anime_id INTEGER PRIMARY KEY,
+        title TEXT,
+        episodes INTEGER,
+        genres TEXT,
+        cover_large TEXT,
+        cover_medium TEXT,
+        cover_color TEXT,
+        description TEXT,
+        next_episode INTEGER,
+        next_airing_at INTEGER,
+        fetched_at REAL
+    );
+    """,
+    # 2: per-guild notification settings
+    """
+    CREATE TABLE guild_config (
+        guild_id INTEGER PRIMARY KEY,
+        alert_channel_id INTEGER,
+        alert_role_id INTEGER,
+        timezone TEXT
+    );
+    """,
+    # 3: bookkeeping such as the last synced command tree
+    """
+    CREATE TABLE bot_meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+    """,
+    # 4: anime_id breaks title ties, so keyset list pages are an index range
+    """
+    DROP INDEX tracked_anime_user_status_name;
+    CREATE INDEX tracked_anime_user_status_name ON tracked_anime (user_id, status, anime_name, anime_id);
+    """,
+    # 5: every title variant, for the /track title index
+    """
+    ALTER TABLE anime_media ADD COLUMN title_english TEXT;
+    ALTER TABLE anime_media ADD COLUMN synonyms TEXT NOT NULL DEFAULT '[]';
+    """,
+]
+
+
+@contextlib.contextmanager
+def _transaction(conn):
+    conn.execute("BEGIN")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def _alias_in_use(alias):
+    return ValueError(f"Alias '{alias}' is already in use.")
+
+
+# ---------------- SQLITE (thread-offloaded sqlite3) ----------------
+# One connection on one worker thread, so calls are serialised like a pool of
+# size one and never block the event loop. path is a file or ":memory:".
+class SQLiteStorage(Storage):
+    name = "sqlite"
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self.conn = None
+        self._executor = None
+        self._lock = asyncio.Lock()
+
+    async def connect(self):
+        if self.conn is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+            self.conn = await asyncio.get_running_loop().run_in_executor(self._executor, self._open)
+        await self._run(self._migrate)
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        if self.path != ":memory:":
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA busy_timeout = 10000")
+        return conn
+
+    async def close(self):
+        if self.conn is not None:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self.conn.close)
+            self._executor.shutdown()
+            self.conn = self._executor = None
+
+    @staticmethod
+    def _migrate(conn):
+        with _transaction(conn):
+            conn.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)")
+            version = conn.execute("SELECT coalesce(max(version), 0) FROM schema_version").fetchone()[0]
+        for v, sql in enumerate(MIGRATIONS[version:], start=version + 1):
+            # executescript commits first, so the migration carries its own transaction
+            try:
+                conn.executescript(f"BEGIN; {sql}; INSERT INTO schema_version (version) VALUES ({v}); COMMIT;")
+            except sqlite3.Error:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            print(f"✅ Applied database migration {v}.")
+
+    async def _lock_conn(self):
+        await self._lock.acquire()
+        return self.conn
+
+    async def _unlock_conn(self, conn):
+        self._lock.release()
+
+    # Runs fn(conn, *args) on the database thread
+    async def _run(self, fn, *args):
+        async with self._timed_acquire(self._lock_conn, self._unlock_conn) as conn:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, conn, *args)
+
+    async def _execute(self, sql, *args):
+        return await self._run(lambda conn: conn.execute(sql, args).rowcount)
+
+    async def _fetch(self, sql, *args):
+        return await self._run(lambda conn: conn.execute(sql, args).fetchall())
+
+    async def _fetchrow(self, sql, *args):
+        return await self._run(lambda conn: conn.execute(sql, args).fetchone())
+
+    # ---------------- TRACKED ANIME ----------------
+    async def add_anime(self, user_id, anime_id, anime_name, alias, episode, status):
+        try:
+            inserted = await self._execute("""
+                INSERT INTO tracked_anime
+                (user_id, anime_id, anime_name, alias, last_watched, last_notified, status)
+                VALUES (?1, ?2, ?3, ?4, ?5, ?5, ?6)
+                ON CONFLICT (user_id, anime_id) DO NOTHING
+            """, user_id, anime_id, anime_name, alias, episode, status)
+        except sqlite3.IntegrityError as e:
+            if "UNIQUE" in str(e):
+                raise _alias_in_use(alias)
+            raise
+        return inserted == 1
+
+    # The Postgres staging-table merge, with the staging table filled by executemany
+    async def import_tracked(self, user_id, rows):
+        def load(conn):
+            with _transaction(conn):
+                conn.execute("""
+                    CREATE TEMP TABLE IF NOT EXISTS tracked_import (
+                        anime_id INTEGER, anime_name TEXT, alias TEXT, last_watched INTEGER, status TEXT
+                    )
+                """)
+                conn.execute("DELETE FROM tracked_import")
+                conn.executemany("INSERT INTO tracked_import VALUES (?, ?, ?, ?, ?)", rows)
+                existing = {r[0] for r in conn.execute("""
+                    SELECT anime_id FROM tracked_anime
+                    WHERE user_id = ? AND anime_id IN (SELECT anime_id FROM tracked_import)
+                """, (user_id,))}
+                changed = conn.execute("""
+                    INSERT INTO tracked_anime
+                    (user_id, anime_id, anime_name, alias, last_watched, last_notified, status)
+                    SELECT ?1, anime_id, anime_name, alias, last_watched, last_watched, status
+                    FROM tracked_import WHERE true
+                    ON CONFLICT (user_id, anime_id) DO UPDATE SET last_watched = excluded.last_watched
+                        WHERE last_watched < excluded.last_watched
+                    RETURNING anime_id, alias, anime_name, coalesce(last_notified, 0), status
+                """, (user_id,)).fetchall()
+            return [(*r, r[0] not in existing) for r in changed]
+        try:
+            return await self._run(load)
+        except sqlite3.IntegrityError as e:
+            if "UNIQUE" in str(e):
+                raise ValueError("An alias was taken while importing; try again.")
+            raise
+
+    async def update_progress(self, user_id, anime_id, episode):
+        row = await self._fetchrow("""
+            UPDATE tracked_anime
+            SET last_watched = ?, status = 'watching'
+            WHERE user_id = ? AND anime_id = ?
+            RETURNING coalesce(last_notified, 0)
+        """, episode, user_id, anime_id)
+        return row[0] if row else None
+
+    async def update_status(self, user_id, anime_id, status):
+        row = await self._fetchrow("""
+            UPDATE tracked_anime
+            SET status = ?
+            WHERE user_id = ? AND anime_id = ?
+            RETURNING coalesce(last_notified, 0)
+        """, status, user_id, anime_id)
+        return row[0] if row else None
+
+    async def apply_progress_many(self, rows):
+        def update(conn):
+            with _transaction(conn):
+                conn.executemany("""
+                    UPDATE tracked_anime
+                    SET last_watched = ?3, status = ?4
+                    WHERE user_id = ?1 AND anime_id = ?2
+                """, rows)
+        await self._run(update)
+
+    async def claim_notifications(self, anime_id, episode, user_ids):
+        user_ids = list(user_ids)
+
+        def claim(conn):
+            claimed = []
+            with _transaction(conn):
+                for i in range(0, len(user_ids), MEDIA_BATCH):
+                    batch = user_ids[i:i + MEDIA_BATCH]
+                    claimed += [r[0] for r in conn.execute(f"""
+                        UPDATE tracked_anime
+                        SET last_notified = ?
+                        WHERE anime_id = ? AND coalesce(last_notified, 0) < ?
+                          AND user_id IN ({", ".join("?" * len(batch))})
+                        RETURNING user_id
+                    """, (episode, anime_id, episode, *batch)).fetchall()]
+            return claimed
+        return await self._run(claim)
+
+    async def update_alias(self, user_id, anime_id, new_alias):
+        try:
+            await self._execute("""
+                UPDATE tracked_anime
+                SET alias = ?
+                WHERE user_id = ? AND anime_id = ?
+            """, new_alias, user_id, anime_id)
+        except sqlite3.IntegrityError as e:
+            if "UNIQUE" in str(e):
+                raise _alias_in_use(new_alias)
+            raise
+
+    async def get_progress(self, user_id, identifier):
+        return await self._fetchrow("""
+            SELECT anime_name, alias, last_watched, anime_id, status
+            FROM tracked_anime
+            WHERE user_id = ?1
+              AND (alias = ?2 OR anime_name = ?2)
+        """, user_id, identifier)
+
+    async def list_page(self, user_id, status, limit, cursor=None):
+        args = (user_id, status, limit) + ((cursor[1],) if cursor else ())
+        rows = await self._fetch(list_page_sql(cursor, lambda n: f"?{n}"), *args)
+        counts = await self._fetch(COUNT_BY_STATUS_SQL.format("?"), user_id)
+        if cursor and cursor[0] == "before":
+            rows.reverse()
+        return rows, {s: n for s, n in counts}
+
+    async def alias_rows(self, user_id):
+        rows = await self._fetch("""
+            SELECT anime_id, alias, anime_name
+            FROM tracked_anime
+            WHERE user_id = ?
+        """, user_id)
+        return [tuple(r) for r in rows]
+
+    async def progress_rows(self, user_id):
+        return await self._fetch("""
+            SELECT anime_name, alias, last_watched, anime_id, status, coalesce(last_notified, 0)
+            FROM tracked_anime
+            WHERE user_id = ?
+        """, user_id)
+
+    async def tracker_rows(self):
+        return await self._fetch("""
+            SELECT anime_id, user_id, coalesce(last_notified, 0)
+            FROM tracked_anime
+            WHERE status <> 'watched'
+        """)
+
+    async def get_tracked_anime_ids(self):
+        rows = await self._fetch("""
+            SELECT DISTINCT anime_id
+            FROM tracked_anime
+            WHERE status <> 'watched'
+        """)
+        return [r["anime_id"] for r in rows]
+
+    async def get_trackers(self, anime_id):
+        return await self._fetch("""
+            SELECT user_id, last_notified
+            FROM tracked_anime
+            WHERE anime_id = ? AND status <> 'watched'
+        """, anime_id)
+
+    async def remove_anime(self, user_id, anime_id):
+        await self._execute("""
+            DELETE FROM tracked_anime
+            WHERE user_id = ? AND anime_id = ?
+        """, user_id, anime_id)
+
+    # ---------------- ANILIST MEDIA ----------------
+    async def upsert_media(self, rows):
+        now = time.time()
+        rows = [(*r[:3], json.dumps(list(r[3])), *r[4:11], json.dumps(list(r[11])), now) for r in rows]
+
+        def upsert(conn):
+            with _transaction(conn):
+                conn.executemany("""
+                    INSERT INTO anime_media
+                    (anime_id, title, episodes, genres, cover_large, cover_medium, cover_color,
+                     description, next_episode, next_airing_at, title_english, synonyms, fetched_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (anime_id) DO UPDATE SET
+                        title = excluded.title,
+                        episodes = excluded.episodes,
+                        genres = excluded.genres,
+                        cover_large = excluded.cover_large,
+                        cover_medium = excluded.cover_medium,
+                        cover_color = excluded.cover_color,
+                        description = excluded.description,
+                        next_episode = excluded.next_episode,
+                        next_airing_at = excluded.next_airing_at,
+                        title_english = excluded.title_english,
+                        synonyms = excluded.synonyms,
+                        fetched_at = excluded.fetched_at
+                """, rows)
+        await self._run(upsert)
+
+    async def get_media(self, anime_ids):
+        anime_ids = list(anime_ids)
+
+        def fetch(conn):
+            rows = []
+            for i in range(0, len(anime_ids), MEDIA_BATCH):
+                batch = anime_ids[i:i + MEDIA_BATCH]
+                rows += conn.execute(f"""
+                    SELECT {MEDIA_COLUMNS}
+                    FROM anime_media
+                    WHERE anime_id IN ({", ".join("?" * len(batch))})
+                """, batch).fetchall()
+            return rows
+        return {r["anime_id"]: media_from_row(r) for r in await self._run(fetch)}
+
+    async def load_media(self, limit):
+        rows = await self._fetch(f"""
+            SELECT {MEDIA_COLUMNS}
+            FROM anime_media
+            ORDER BY fetched_at DESC
+            LIMIT ?
+        """, limit)
+        return [(media_from_row(r), r["fetched_at"]) for r in rows]
+
+    async def title_rows(self):
+        rows = await self._fetch("""
+            SELECT anime_id, title, title_english, synonyms FROM anime_media
+            UNION ALL
+            SELECT DISTINCT anime_id, anime_name, NULL, '[]' FROM tracked_anime t
+            WHERE NOT EXISTS (SELECT 1 FROM anime_media m WHERE m.anime_id = t.anime_id)
+        """)
+        return [(anime_id, title, english, json.loads(synonyms)) for anime_id, title, english, synonyms in rows]
+
+    # ---------------- GUILD CONFIG ----------------
+    async def get_guild_configs(self):
+        return await self._fetch("""
+            SELECT guild_id, alert_channel_id, alert_role_id, timezone
+            FROM guild_config
+        """)
+
+    async def set_guild_config(self, guild_id, alert_channel_id, alert_role_id, timezone):
+        await self._execute("""
+            INSERT INTO guild_config (guild_id, alert_channel_id, alert_role_id, timezone)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (guild_id) DO UPDATE SET
+                alert_channel_id = excluded.alert_channel_id,
+                alert_role_id = excluded.alert_role_id,
+                timezone = excluded.timezone
+        """, guild_id, alert_channel_id, alert_role_id, timezone)
+
+    # ---------------- BOT META ----------------
+    async def get_meta(self, key):
+        row = await self._fetchrow("SELECT value FROM bot_meta WHERE key = ?", key)
+        return row[0] if row else None
+
+    async def set_meta(self, key, value):
+        await self._execute("""
+            INSERT INTO bot_meta (key, value) VALUES (?, ?)
+            ON CONFLICT (key) DO UPDATE SET value = excluded.value
+        """, key, value)
@@ -0,0 +1,49 @@
+import time
+import unittest
+from unittest import mock
+import cache
+from cache import MediaCache, Partial
+
+
+class MediaCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = MediaCache(2, ttl=600, negative_ttl=30)
+
+    def expires_in(self, key):
+        return self.cache._entries[key][1] - time.time()
+
+    def test_partial_results_expire_like_failures(self):
+        self.cache.set("season", Partial([{"id": 1}]))
+        self.assertEqual(self.cache.peek("season"), [{"id": 1}])
+        self.assertLessEqual(self.expires_in("season"), 30)
+
+    def test_partial_results_keep_a_complete_copy(self):
+        self.cache.set("season", [{"id": 1}, {"id": 2}])
+        self.cache.set("season", Partial([{"id": 1}]))
+        self.assertEqual(self.cache.peek("season"), [{"id": 1}, {"id": 2}])
+        self.cache.set("season", [{"id": 1}, {"id": 2}, {"id": 3}])
+        self.assertGreater(self.expires_in("season"), 30)
+
+
+class FetchSeasonTest(unittest.IsolatedAsyncioTestCase):
+    async def fetch(self, pages):
+        async def iter_seasonal_anime(season, year, priority):
+            for page, media in pages:
+                yield page, media
+
+        with mock.patch("cache.iter_seasonal_anime", iter_seasonal_anime):
+            return await cache._fetch_season("WINTER", 2026, None, cache.INTERACTIVE)
+
+    async def test_complete_season(self):
+        media = await self.fetch([(1, [{"id": 1}]), (3, [{"id": 3}]), (2, [{"id": 2}])])
+        self.assertNotIsInstance(media, Partial)
+        self.assertEqual([m["id"] for m in media], [1, 2, 3])
+
+    async def test_failed_page_makes_the_season_partial(self):
+        media = await self.fetch([(1, [{"id": 1}]), (2, None), (3, [{"id": 3}])])
+        self.assertIsInstance(media, Partial)
+        self.assertEqual([m["id"] for m in media], [1])
+
+
+if __name__ == "__main__":
+    unittest.main()
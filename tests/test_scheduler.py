@@ -0,0 +1,67 @@
+import asyncio
+import time
+import unittest
+from unittest import mock
+from scheduler import AiringScheduler
+
+
+def airing(anime_id, episode, airing_at):
+    return {"id": anime_id, "nextAiringEpisode": {"episode": episode, "airingAt": airing_at}}
+
+
+class AiringSchedulerTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.media = {}
+        self.notified = []
+        self.failures = 0
+
+        async def fetch(ids):
+            return {i: self.media[i] for i in ids if i in self.media}
+
+        async def notify(data, episode):
+            self.notified.append((data["id"], episode))
+            if self.failures:
+                self.failures -= 1
+                raise RuntimeError("database unavailable")
+
+        self.scheduler = AiringScheduler(fetch, notify)
+
+    async def asyncTearDown(self):
+        self.scheduler.stop()
+
+    async def wait_for(self, condition, timeout=2.0):
+        deadline = time.monotonic() + timeout
+        while not condition() and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        return condition()
+
+    async def test_notifies_due_episode_and_plans_the_next(self):
+        self.media[1] = airing(1, 3, time.time() - 1)
+        await self.scheduler.plan([1])
+        self.media[1] = airing(1, 4, time.time() + 3600)
+        self.scheduler.start()
+        self.assertTrue(await self.wait_for(lambda: self.notified))
+        self.assertEqual(self.notified, [(1, 3)])
+        self.assertTrue(await self.wait_for(lambda: self.scheduler._planned.get(1, (0, 0))[1] == 4))
+
+    async def test_failed_notify_retries_the_same_episode(self):
+        self.media[1] = airing(1, 3, time.time() - 1)
+        self.failures = 1
+        with mock.patch("scheduler.RETRY_DELAY", 0.05):
+            await self.scheduler.plan([1])
+            self.scheduler.start()
+            self.assertTrue(await self.wait_for(lambda: len(self.notified) == 2))
+        self.assertEqual(self.notified, [(1, 3), (1, 3)])
+
+    async def test_delayed_episode_is_rescheduled_without_notifying(self):
+        self.media[1] = airing(1, 3, time.time() - 1)
+        await self.scheduler.plan([1])
+        later = time.time() + 3600
+        self.media[1] = airing(1, 3, later)
+        self.scheduler.start()
+        self.assertTrue(await self.wait_for(lambda: self.scheduler._planned.get(1) == (later, 3)))
+        self.assertEqual(self.notified, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
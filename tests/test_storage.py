@@ -0,0 +1,146 @@
+import os
+import random
+import unittest
+from storage import open_storage
+from storage.base import Storage, media_to_row
+
+# Postgres runs the same cases when pointed at a scratch database; each case
+# uses a fresh random user id and removes its rows afterwards
+POSTGRES_URL = os.getenv("TEST_DATABASE_URL")
+
+
+def media(anime_id, title, next_episode=None):
+    return {
+        "id": anime_id,
+        "title": {"romaji": title, "english": None},
+        "synonyms": [],
+        "episodes": 12,
+        "genres": ["Action"],
+        "coverImage": {"large": None, "medium": None, "color": None},
+        "description": None,
+        "nextAiringEpisode": {"episode": next_episode, "airingAt": 1_700_000_000} if next_episode else None,
+    }
+
+
+# ---------------- CONTRACT ----------------
+# The behaviour database.py relies on, run against every backend
+class StorageContract:
+    url = None
+
+    async def asyncSetUp(self):
+        self.db = open_storage(self.url)
+        await self.db.connect()
+        self.user = random.randrange(1, 2 ** 40)
+
+    async def asyncTearDown(self):
+        for anime_id, _, _ in await self.db.alias_rows(self.user):
+            await self.db.remove_anime(self.user, anime_id)
+        await self.db.close()
+
+    async def test_add_anime_reports_duplicates(self):
+        self.assertTrue(await self.db.add_anime(self.user, 1, "Frieren", "frieren", 0, "watching"))
+        self.assertFalse(await self.db.add_anime(self.user, 1, "Frieren", "other", 3, "watched"))
+        row = await self.db.get_progress(self.user, "frieren")
+        self.assertEqual(tuple(row), ("Frieren", "frieren", 0, 1, "watching"))
+
+    async def test_alias_clash_raises_value_error(self):
+        await self.db.add_anime(self.user, 1, "Frieren", "f", 0, "watching")
+        await self.db.add_anime(self.user, 2, "Dandadan", "d", 0, "watching")
+        with self.assertRaises(ValueError):
+            await self.db.add_anime(self.user, 3, "Fire Force", "f", 0, "watching")
+        with self.assertRaises(ValueError):
+            await self.db.update_alias(self.user, 2, "f")
+
+    async def test_update_returns_last_notified(self):
+        await self.db.add_anime(self.user, 1, "Frieren", "frieren", 4, "watching")
+        self.assertEqual(await self.db.update_progress(self.user, 1, 6), 4)
+        self.assertEqual(await self.db.update_status(self.user, 1, "watched"), 4)
+        self.assertIsNone(await self.db.update_progress(self.user, 2, 1))
+        self.assertIsNone(await self.db.update_status(self.user, 2, "watched"))
+        self.assertEqual(tuple(await self.db.get_progress(self.user, "Frieren")), ("Frieren", "frieren", 6, 1, "watched"))
+
+    async def test_claim_notifications_once(self):
+        await self.db.add_anime(self.user, 1, "Frieren", "frieren", 2, "watching")
+        self.assertEqual(list(await self.db.claim_notifications(1, 3, [self.user])), [self.user])
+        self.assertEqual(list(await self.db.claim_notifications(1, 3, [self.user])), [])
+        self.assertEqual(await self.db.update_progress(self.user, 1, 3), 3)
+
+    async def test_list_page_keyset_order(self):
+        names = ["Bleach", "Akira", "Dororo", "Claymore", "Eden"]
+        for anime_id, name in enumerate(names, start=1):
+            await self.db.add_anime(self.user, anime_id, name, name.lower(), 0, "watching")
+        await self.db.add_anime(self.user, 9, "Another", "another", 0, "watched")
+
+        def titles(rows):
+            return [r[0] for r in rows]
+
+        rows, counts = await self.db.list_page(self.user, "watching", 2)
+        self.assertEqual(titles(rows), ["Akira", "Bleach"])
+        self.assertEqual(counts, {"watching": 5, "watched": 1})
+        rows, _ = await self.db.list_page(self.user, "watching", 2, ("after", rows[-1][3]))
+        self.assertEqual(titles(rows), ["Claymore", "Dororo"])
+        after, _ = await self.db.list_page(self.user, "watching", 2, ("after", rows[-1][3]))
+        self.assertEqual(titles(after), ["Eden"])
+        before, _ = await self.db.list_page(self.user, "watching", 2, ("before", rows[0][3]))
+        self.assertEqual(titles(before), ["Akira", "Bleach"])
+        same, _ = await self.db.list_page(self.user, "watching", 2, ("from", rows[0][3]))
+        self.assertEqual(titles(same), ["Claymore", "Dororo"])
+
+    async def test_import_tracked_merges_forward(self):
+        await self.db.add_anime(self.user, 1, "Frieren", "frieren", 5, "watching")
+        await self.db.add_anime(self.user, 2, "Dandadan", "dandadan", 8, "watching")
+        changed = await self.db.import_tracked(self.user, [
+            (1, "Frieren", "frieren2", 7, "watched"),   # moves forward
+            (2, "Dandadan", "dandadan2", 3, "watched"),  # behind: untouched
+            (3, "Akira", "akira", 1, "want_to_watch"),  # new
+        ])
+        self.assertEqual(sorted(tuple(r) for r in changed), [
+            (1, "frieren", "Frieren", 5, "watching", False),
+            (3, "akira", "Akira", 1, "want_to_watch", True),
+        ])
+        self.assertEqual(tuple(await self.db.get_progress(self.user, "frieren")), ("Frieren", "frieren", 7, 1, "watching"))
+        self.assertEqual((await self.db.get_progress(self.user, "dandadan"))[2], 8)
+
+    async def test_import_tracked_alias_clash(self):
+        await self.db.add_anime(self.user, 1, "Frieren", "f", 0, "watching")
+        with self.assertRaises(ValueError):
+            await self.db.import_tracked(self.user, [(2, "Fire Force", "f", 0, "watching")])
+        self.assertEqual([r[0] for r in await self.db.alias_rows(self.user)], [1])
+
+    async def test_trackers_skip_watched(self):
+        await self.db.add_anime(self.user, 1, "Frieren", "frieren", 2, "watching")
+        await self.db.add_anime(self.user, 2, "Dandadan", "dandadan", 0, "watched")
+        self.assertIn((self.user, 2), [tuple(r) for r in await self.db.get_trackers(1)])
+        self.assertNotIn(self.user, [r[0] for r in await self.db.get_trackers(2)])
+        self.assertIn((1, self.user, 2), [tuple(r) for r in await self.db.tracker_rows()])
+
+    async def test_media_round_trip(self):
+        anime_id = random.randrange(1, 2 ** 31)
+        await self.db.upsert_media([media_to_row(media(anime_id, "Frieren", next_episode=5))])
+        self.assertEqual(await self.db.get_media([anime_id]), {anime_id: media(anime_id, "Frieren", next_episode=5)})
+
+    async def test_meta(self):
+        key = f"test-{self.user}"
+        self.assertIsNone(await self.db.get_meta(key))
+        await self.db.set_meta(key, "a")
+        await self.db.set_meta(key, "b")
+        self.assertEqual(await self.db.get_meta(key), "b")
+
+
+class SQLiteStorageTest(StorageContract, unittest.IsolatedAsyncioTestCase):
+    url = "sqlite://:memory:"
+
+
+@unittest.skipUnless(POSTGRES_URL, "set TEST_DATABASE_URL to run against Postgres")
+class PostgresStorageTest(StorageContract, unittest.IsolatedAsyncioTestCase):
+    url = POSTGRES_URL
+
+
+class InterfaceTest(unittest.TestCase):
+    def test_storage_is_abstract(self):
+        with self.assertRaises(TypeError):
+            Storage()
+
+
+if __name__ == "__main__":
+    unittest.main()
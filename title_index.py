@@ -0,0 +1,141 @@
+import re
+from array import array
+from collections import defaultdict, OrderedDict
+
+SUGGEST_THRESHOLD = 0.3   # share of the query's trigrams a title must contain to be suggested
+RESOLVE_THRESHOLD = 0.8   # shared / all trigrams of query and title for /track to pick it without asking AniList
+MAX_TITLES = 50_000       # anime kept in the index; the least recently seen are dropped first
+
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def normalize(text):
+    return _NON_WORD.sub(" ", (text or "").lower()).strip()
+
+
+# pg_trgm-style trigrams: each word padded with two spaces in front and one behind
+def trigrams(text):
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+# Every title variant (romaji, English, synonyms) of a media object
+def media_titles(m):
+    title = m.get("title") or {}
+    return [t for t in (title.get("romaji"), title.get("english"), *(m.get("synonyms") or ())) if t]
+
+
+# ---------------- TITLE INDEX ----------------
+# Trigram index over the titles of the anime the bot has seen most recently:
+# stored media, tracked rows, and whatever AniList returns while it runs.
+# Drives /track autocomplete and lets /track resolve free text without an
+# AniList search. Each title variant gets an integer id into _keys, and
+# postings are compact arrays of those ids; dropped variants leave a None
+# behind until half the ids are dead and the postings are rebuilt.
+class TitleIndex:
+    def __init__(self, max_titles=MAX_TITLES):
+        self.max_titles = max_titles
+        self._titles = OrderedDict()       # anime_id -> (display title, {normalized variant: original}, variant ids)
+        self._keys = []                    # variant id -> (anime_id, normalized variant, trigram count) or None
+        self._postings = defaultdict(lambda: array("i"))  # trigram -> variant ids
+        self._dead = 0
+
+    def __len__(self):
+        return len(self._titles)
+
+    def add(self, anime_id, titles):
+        if not titles:
+            return
+        variants = {}
+        for t in titles:
+            if v := normalize(t):
+                variants.setdefault(v, t)
+        old = self._titles.get(anime_id)
+        if old and old[1] == variants:
+            self._titles.move_to_end(anime_id)
+            return
+        if old:
+            self._drop(anime_id)
+        self._titles[anime_id] = (titles[0], variants, self._post(anime_id, variants))
+        while len(self._titles) > self.max_titles:
+            self._drop(next(iter(self._titles)))
+
+    def _post(self, anime_id, variants):
+        ids = []
+        for variant in variants:
+            grams = trigrams(variant)
+            ids.append(vid := len(self._keys))
+            self._keys.append((anime_id, variant, len(grams)))
+            for gram in grams:
+                self._postings[gram].append(vid)
+        return ids
+
+    def _drop(self, anime_id):
+        for vid in self._titles.pop(anime_id)[2]:
+            self._keys[vid] = None
+            self._dead += 1
+        if self._dead > 1000 and self._dead * 2 > len(self._keys):
+            self._keys, self._postings, self._dead = [], defaultdict(lambda: array("i")), 0
+            for anime_id, (title, variants, _) in self._titles.items():
+                self._titles[anime_id] = (title, variants, self._post(anime_id, variants))
+
+    def add_media(self, media_list):
+        for m in media_list:
+            if m:
+                self.add(m["id"], media_titles(m))
+
+    def title(self, anime_id):
+        entry = self._titles.get(anime_id)
+        return entry[0] if entry else None
+
+    # {(anime_id, normalized variant, trigram count): trigrams shared with grams}
+    def _hits(self, grams):
+        counts = defaultdict(int)
+        for gram in grams:
+            for vid in self._postings.get(gram, ()):
+                counts[vid] += 1
+        return {key: shared for vid, shared in counts.items() if (key := self._keys[vid]) is not None}
+
+    # [(anime_id, display title, matched variant, score)] best first. Scores are
+    # the share of the query's trigrams a title variant contains; ties go to
+    # substring matches, then to the closer length.
+    def search(self, query, limit=25, threshold=SUGGEST_THRESHOLD):
+        query = normalize(query)
+        if not (grams := trigrams(query)):
+            return []
+        best = {}
+        for (anime_id, variant, _), shared in self._hits(grams).items():
+            score = shared / len(grams)
+            if score < threshold:
+                continue
+            rank = (score, query in variant, -abs(len(variant) - len(query)), variant)
+            if anime_id not in best or rank > best[anime_id]:
+                best[anime_id] = rank
+        results = []
+        for anime_id, (score, _, _, variant) in sorted(best.items(), key=lambda item: item[1], reverse=True)[:limit]:
+            title, variants, _ = self._titles[anime_id]
+            results.append((anime_id, title, variants[variant], score))
+        return results
+
+    # The anime a free-text query names, or None. Unlike search() the score is
+    # symmetric (shared / union of both trigram sets), so a longer title that
+    # merely contains the query ("naruto" -> "Naruto: Shippuuden") falls short.
+    # Two anime tying for the best score count as no match.
+    def resolve(self, query, threshold=RESOLVE_THRESHOLD):
+        query = normalize(query)
+        if not (grams := trigrams(query)):
+            return None
+        best = {}
+        for (anime_id, _, size), shared in self._hits(grams).items():
+            score = shared / (len(grams) + size - shared)
+            best[anime_id] = max(score, best.get(anime_id, 0.0))
+        ranked = sorted(best.values(), reverse=True)[:2]
+        if not ranked or ranked[0] < threshold or ranked[1:] == ranked[:1]:
+            return None
+        return max(best, key=best.get)
+
+
+title_index = TitleIndex()
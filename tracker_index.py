@@ -0,0 +1,109 @@
+from array import array
+from bisect import bisect_left
+
+
+# ---------------- NOTIFIER PROJECTION ----------------
+# anime_id -> the users who get alerts for it (any status but watched) and
+# their last_notified episode, as two parallel arrays of 64-bit ints rather
+# than a Record per row, kept sorted by user id so lookups bisect. Loaded once by database.refresh_trackers() and kept
+# current from tracked_anime change events, so the notifier never rescans the
+# table. Events that arrive while a snapshot loads are replayed on top of it.
+class TrackerIndex:
+    def __init__(self):
+        self._anime = {}          # anime_id -> (sorted user ids, last_notified)
+        self._pending = None      # events buffered during a load
+        self._generation = 0      # bumped by invalidate(), guards loads racing a lost listener
+        self.ready = False
+
+    def __len__(self):
+        return sum(len(users) for users, _ in self._anime.values())
+
+    def begin_load(self):
+        self._pending = []
+        return self._generation
+
+    # rows: (anime_id, user_id, last_notified) of every alerting row, unique per
+    # (anime_id, user_id); sorted once so each one is a plain append
+    def finish_load(self, rows, token):
+        pending, self._pending = self._pending or [], None
+        if token != self._generation:
+            return False
+        self._anime = {}
+        for anime_id, user_id, last_notified in sorted(rows, key=lambda r: (r[0], r[1])):
+            users, notified = self._anime.setdefault(anime_id, (array("q"), array("q")))
+            users.append(user_id)
+            notified.append(last_notified or 0)
+        for replay, args in pending:
+            replay(*args)
+        self.ready = True
+        return True
+
+    def abort_load(self):
+        self._pending = None
+
+    # The change feed broke; lookups fall back to the database until the next load
+    def invalidate(self):
+        self._generation += 1
+        self.ready = False
+
+    # One row's new state; alerting False for deleted or watched rows
+    def apply(self, anime_id, user_id, last_notified, alerting):
+        if self._pending is not None:
+            self._pending.append((self.apply, (anime_id, user_id, last_notified, alerting)))
+        elif alerting:
+            self._set(anime_id, user_id, last_notified)
+        else:
+            self._remove(anime_id, user_id)
+
+    def advance(self, anime_id, user_ids, episode):
+        if self._pending is not None:
+            self._pending.append((self.advance, (anime_id, list(user_ids), episode)))
+            return
+        if not (entry := self._anime.get(anime_id)):
+            return
+        users, notified = entry
+        for user_id in user_ids:
+            if (i := _find(users, user_id)) is not None and notified[i] < episode:
+                notified[i] = episode
+
+    def _set(self, anime_id, user_id, last_notified):
+        users, notified = self._anime.setdefault(anime_id, (array("q"), array("q")))
+        i = bisect_left(users, user_id)
+        if i < len(users) and users[i] == user_id:
+            notified[i] = last_notified or 0
+        else:
+            users.insert(i, user_id)
+            notified.insert(i, last_notified or 0)
+
+    def _remove(self, anime_id, user_id):
+        if not (entry := self._anime.get(anime_id)):
+            return
+        users, notified = entry
+        if (i := _find(users, user_id)) is None:
+            return
+        users.pop(i)
+        notified.pop(i)
+        if not users:
+            del self._anime[anime_id]
+
+    # [(user_id, last_notified)], like the rows database.get_trackers reads
+    def trackers(self, anime_id):
+        users, notified = self._anime.get(anime_id, ((), ()))
+        return list(zip(users, notified))
+
+    def anime_ids(self):
+        return list(self._anime)
+
+    # The user's last_notified for anime_id, or None if they get no alerts for it
+    def notified(self, anime_id, user_id):
+        users, notified = self._anime.get(anime_id, ((), ()))
+        return notified[i] if (i := _find(users, user_id)) is not None else None
+
+
+# Index of user_id in a sorted array, or None
+def _find(users, user_id):
+    i = bisect_left(users, user_id)
+    return i if i < len(users) and users[i] == user_id else None
+
+
+tracker_index = TrackerIndex()
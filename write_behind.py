@@ -0,0 +1,99 @@
+from collections import OrderedDict
+
+MAX_USERS = 10_000
+
+
+# ---------------- WRITE-BEHIND PROGRESS ----------------
+# Each user's tracked rows as [anime_name, alias, last_watched, anime_id,
+# status, last_notified], loaded lazily like alias_index, plus the progress and
+# status changes not yet written back. Repeated changes to one row collapse
+# into one pending (last_watched, status); database.py drains them into a
+# batched UPDATE. Pending values are replayed over rows loaded after an
+# eviction, so a flush never waits on the user still being in memory.
+class WriteBehind:
+    def __init__(self, max_users=MAX_USERS):
+        self.max_users = max_users
+        self._users = OrderedDict()  # user_id -> {anime_id: row}, least recently used first
+        self._generation = {}        # user_id -> write counter, guards loads racing writes
+        self._pending = {}           # (user_id, anime_id) -> (last_watched, status)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def loaded(self, user_id):
+        return user_id in self._users
+
+    def begin_load(self, user_id):
+        return self._generation.setdefault(user_id, 0)
+
+    # rows: (anime_name, alias, last_watched, anime_id, status, last_notified)
+    def finish_load(self, user_id, rows, token):
+        if self._generation.get(user_id, 0) != token:
+            return False
+        entries = {r[3]: list(r) for r in rows}
+        for (pending_user, anime_id), (last_watched, status) in self._pending.items():
+            if pending_user == user_id and anime_id in entries:
+                entries[anime_id][2], entries[anime_id][4] = last_watched, status
+        self._users[user_id] = entries
+        while len(self._users) > self.max_users:
+            evicted, _ = self._users.popitem(last=False)
+            self._generation.pop(evicted, None)
+        return True
+
+    def _write(self, user_id):
+        if user_id in self._generation:
+            self._generation[user_id] += 1
+        return self._users.get(user_id)
+
+    # The row matching an alias or, failing that, a title, as get_progress returns it
+    def get(self, user_id, identifier):
+        self._users.move_to_end(user_id)
+        rows = self._users[user_id].values()
+        row = next((r for r in rows if r[1] == identifier), None) or next((r for r in rows if r[0] == identifier), None)
+        return tuple(row[:5]) if row else None
+
+    # Records a change to a loaded user's row; returns its last_notified, or None if it isn't tracked
+    def update(self, user_id, anime_id, last_watched=None, status=None):
+        if not (row := self._users[user_id].get(anime_id)):
+            return None
+        self._write(user_id)
+        if last_watched is not None:
+            row[2] = last_watched
+        if status is not None:
+            row[4] = status
+        self._pending[(user_id, anime_id)] = (row[2], row[4])
+        return row[5]
+
+    def put(self, user_id, anime_id, anime_name, alias, last_watched, status):
+        if (entries := self._write(user_id)) is not None:
+            entries[anime_id] = [anime_name, alias, last_watched, anime_id, status, last_watched]
+
+    def set_alias(self, user_id, anime_id, alias):
+        if (entries := self._write(user_id)) and anime_id in entries:
+            entries[anime_id][1] = alias
+
+    def remove(self, user_id, anime_id):
+        self._pending.pop((user_id, anime_id), None)
+        if entries := self._write(user_id):
+            entries.pop(anime_id, None)
+
+    # Drops the user's rows so the next read reloads them, after a bulk write
+    def forget(self, user_id):
+        self._write(user_id)
+        self._users.pop(user_id, None)
+
+    def has_pending(self, user_id):
+        return any(pending_user == user_id for pending_user, _ in self._pending)
+
+    # Takes every pending change as (user_id, anime_id, last_watched, status)
+    def drain(self):
+        pending, self._pending = self._pending, {}
+        return [(user_id, anime_id, last_watched, status) for (user_id, anime_id), (last_watched, status) in pending.items()]
+
+    # Puts back changes a failed flush took, unless the row has changed again since
+    def requeue(self, rows):
+        for user_id, anime_id, last_watched, status in rows:
+            self._pending.setdefault((user_id, anime_id), (last_watched, status))
+
+
+write_behind = WriteBehind()